@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
+import json
 import os
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -47,7 +48,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.RequestSizeLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,16 +80,74 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'app.wsgi.application'
 
+# Route login, change password and /api/user/me/ to their async views, set
+# by app/asgi.py. Under WSGI every async view would need a thread of its own.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# DB_ENGINE=postgresql switches to PostgreSQL (psycopg2 needs to be installed),
+# configured by the DB_* variables below. DB_REPLICA_HOSTS lists read replicas
+# separated by commas, DB_POOLER=1 is for connections going through a
+# transaction pooler such as PgBouncer.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite3')
+
+# PRAGMAs run on every new SQLite connection. Write-ahead logging lets readers
+# run alongside the writer and busy_timeout (ms) makes writers wait for the
+# lock instead of failing with "database is locked", along with the backend
+# starting transactions with BEGIN IMMEDIATE. SQLITE_WAL=0 keeps the SQLite
+# defaults.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+} if os.environ.get('SQLITE_WAL', '1') == '1' else {}
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'app'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # Seconds a connection is kept open between requests.
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            # Server side cursors don't survive the transaction pooling of PgBouncer.
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_POOLER', '') == '1',
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.backends.sqlite3' if SQLITE_PRAGMAS else 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
+    }
+
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    alias = 'replica_%d' % index
+    host, _, port = host.strip().partition(':')
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host, PORT=port or DATABASES['default'].get('PORT', ''),
+                            TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['core.database.ReplicaRouter']
+
+# Check that persistent connections still work at the start of a request,
+# when they were left idle for more than DATABASE_HEALTH_CHECK_IDLE seconds.
+DATABASE_HEALTH_CHECKS = DATABASES['default'].get('CONN_MAX_AGE', 0) != 0
+DATABASE_HEALTH_CHECK_IDLE = 10
 
 
 # Password validation
@@ -93,15 +155,12 @@ DATABASES = {
 
 AUTH_PASSWORD_VALIDATORS = [
     {
-        'NAME': 'user.validation.UserAttributeSimilarityValidator',
+        'NAME': 'user.validation.MaximumLengthValidator',
     },
     {
         'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
         'OPTIONS': {'min_length': 8}
     },
-    # {
-    #     'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-    # },
     {
         'NAME': 'user.validation.MinimumNumberValidator',
     },
@@ -122,13 +181,121 @@ AUTH_PASSWORD_VALIDATORS = [
     },
     {
         'NAME': 'user.validation.MaximumRepeatingTypeValidator',
-    }
+    },
+    {
+        'NAME': 'user.validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'user.validation.BreachedPasswordValidator',
+    },
 ]
 
+# Longest password accepted anywhere, policies can only lower it.
+PASSWORD_MAX_LENGTH = 4096
+
+# Largest request body accepted on these path prefixes, in bytes.
+REQUEST_BODY_LIMITS = {
+    '/api/change-password/': 32768,
+    '/api/user/': 32768,
+    '/api/user/import/': 256 * 1024 * 1024,
+    '/api/login/': 32768,
+}
+
+# Common and breached password index, built with `manage.py build_password_index`.
+PASSWORD_INDEX_PATH = os.path.join(BASE_DIR, 'password_index.bin')
+
+# Password hashing
+# PASSWORD_HASHER selects the algorithm of new hashes (pbkdf2, argon2 or scrypt),
+# argon2 needs the argon2-cffi package of requirements-argon2.txt.
+# The other ones still verify existing hashes, which are upgraded on login.
+# PASSWORD_HASHER_PARAMS tunes their cost, e.g. {"scrypt": {"n": 32768, "r": 8, "p": 1}}.
+
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+
+PASSWORD_HASHER_PARAMS = json.loads(os.environ.get('PASSWORD_HASHER_PARAMS', '{}'))
+
+PASSWORD_HASHERS = sorted([
+    'user.hashers.PBKDF2PasswordHasher',
+    'user.hashers.Argon2PasswordHasher',
+    'user.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+], key=lambda path: not path.lower().endswith('.%spasswordhasher' % PASSWORD_HASHER))
+
+AUTHENTICATION_BACKENDS = ['user.backends.PooledModelBackend']
+
+# Threads running the password hashers, defaults to the number of CPUs.
+PASSWORD_HASHING_WORKERS = None
+
+# Outdated hashes waiting to be upgraded in the background.
+PASSWORD_REHASH_QUEUE_SIZE = 1000
+
+# Processes hashing the passwords of bulk imported users, defaults to the
+# number of CPUs.
+PASSWORD_IMPORT_WORKERS = None
+
+# Number of compiled password policies kept in memory by each process.
+PASSWORD_POLICY_CACHE_SIZE = 128
+
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework.authentication.TokenAuthentication',),
+    'DEFAULT_AUTHENTICATION_CLASSES': ('user.authentication.CachedTokenAuthentication',),
     'DATETIME_FORMAT': "%m/%d/%Y %H:%M:%S",
+    # Attempts per client IP and per email address, see user.throttling.
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_email': '10/min',
+        'change_password_ip': '30/min',
+        'change_password_email': '10/min',
+    },
+    # Reverse proxies in front of the app. X-Forwarded-For is ignored by
+    # default, the client IP throttled is REMOTE_ADDR, set NUM_PROXIES to the
+    # number of trusted proxies that append to it.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+# Throttling counts are kept in fixed size sketches of DEPTH rows of WIDTH
+# counters in each process (1 MB per rate with these values). Colliding keys
+# can only overcount, keep WIDTH well above the distinct IPs or emails seen in
+# a period. Set CACHE_ALIAS to one of CACHES to share exact counts between
+# processes instead.
+THROTTLE_STORE = {
+    'WIDTH': 65536,
+    'DEPTH': 4,
+    'CACHE_ALIAS': None,
+}
+
+# Authenticated tokens are cached in process for TTL seconds. Set CACHE_ALIAS
+# to one of CACHES to share them between processes as well.
+TOKEN_AUTHENTICATION_CACHE = {
+    'TTL': 5,
+    'MAX_SIZE': 10000,
+    'CACHE_ALIAS': None,
+}
+# Networks allowed to read /metrics, comma separated, e.g. the Prometheus host.
+METRICS_ALLOWED_NETWORKS = [
+    network.strip() for network in os.environ.get('METRICS_ALLOWED_NETWORKS', '127.0.0.1/32,::1/128').split(',')
+    if network.strip()
+]
+
+# Directory the worker processes write their metrics to, so /metrics adds up
+# all the workers, see core.metrics. Empty it when the server starts.
+METRICS_DIRECTORY = os.environ.get('METRICS_DIRECTORY') or None
+METRICS_WRITE_INTERVAL = 1
+
+# Opt-in request profiling, see core.profiling. Requests are saved when picked
+# by SAMPLE_RATE or slower than SLOW_THRESHOLD seconds, summarize them with
+# `manage.py profile_summary`. PROFILER is 'sampler' (a stack sample every
+# INTERVAL seconds) or 'cprofile'.
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING', '0') == '1',
+    'PROFILER': os.environ.get('PROFILING_PROFILER', 'sampler'),
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', '0')),
+    'SLOW_THRESHOLD': float(os.environ.get('PROFILING_SLOW_THRESHOLD', '0')) or None,
+    'INTERVAL': 0.005,
+    'DIRECTORY': os.environ.get('PROFILING_DIRECTORY', os.path.join(BASE_DIR, 'profiles')),
+    'MAX_SAMPLES': 200,
+    'MAX_QUERIES': 1000,
 }
 
 # Internationalization
@@ -13,6 +13,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, re_path
 from django.conf.urls import include
@@ -20,36 +21,66 @@ from django.conf.urls import include
 from rest_framework import routers
 from rest_framework import permissions
 
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
+from core.metrics import metrics_view
 from user import views
 
 ROUTER = routers.SimpleRouter(trailing_slash=True)
 ROUTER.register(r'', views.UserViewSet, basename='user')
 
-SchemaView = get_schema_view(
-    openapi.Info(
-        title="Password API",
-        default_version='v1',
-        description="User can set own password policy.",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="Pravin.Tandale@Xoriant.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
+if settings.ASYNC_VIEWS:
+    # ASGI deployment, see app/asgi.py.
+    LoginView, ChangePasswordView = views.AsyncLoginView, views.AsyncChangePasswordView
+    async_user_urls = [
+        path('api/user/me/', views.AsyncUserViewSet.as_view({'get': 'me'}, basename='user', detail=False),
+             name='user-me'),
+    ]
+else:
+    LoginView, ChangePasswordView = views.LoginView, views.ChangePasswordView
+    async_user_urls = []
+
+_schema_views = {}
+
+
+def get_schema_view():
+    """Build the schema view on first use, drf_yasg is slow to import."""
+    if 'view' not in _schema_views:
+        from drf_yasg.views import get_schema_view
+        from drf_yasg import openapi
+        _schema_views['view'] = get_schema_view(
+            openapi.Info(
+                title="Password API",
+                default_version='v1',
+                description="User can set own password policy.",
+                terms_of_service="https://www.google.com/policies/terms/",
+                contact=openapi.Contact(email="Pravin.Tandale@Xoriant.com"),
+                license=openapi.License(name="BSD License"),
+            ),
+            public=True,
+            permission_classes=[permissions.AllowAny],
+        )
+    return _schema_views['view']
+
+
+def lazy_schema_view(renderer, **kwargs):
+    """Return a view calling the schema view `renderer` UI, built on the first request."""
+    def view(request, *args, **kw):
+        if renderer not in _schema_views:
+            _schema_views[renderer] = get_schema_view().with_ui(renderer, **kwargs)
+        return _schema_views[renderer](request, *args, **kw)
+    return view
+
 
 urlpatterns = [
-    # re_path(r'^swagger(?P<format>.json|.yaml)$', SchemaView.without_ui(cache_timeout=0), name='schema-json'),
-    # path('swagger/', SchemaView.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', SchemaView.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-    # path('redoc-old/', SchemaView.with_ui('redoc-old', cache_timeout=0), name='schema-redoc-old'),
+    # re_path(r'^swagger(?P<format>.json|.yaml)$', get_schema_view().without_ui(cache_timeout=0), name='schema-json'),
+    # path('swagger/', lazy_schema_view('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('redoc/', lazy_schema_view('redoc', cache_timeout=0), name='schema-redoc'),
+    # path('redoc-old/', lazy_schema_view('redoc-old', cache_timeout=0), name='schema-redoc-old'),
+    path('metrics', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
-    path('api/login/', views.LoginView.as_view(), name='login'),
+    path('api/login/', LoginView.as_view(), name='login'),
+    *async_user_urls,
     path('api/user/', include(ROUTER.urls)),
     path('api/password_policy/', include('password_policy.urls')),
-    path('api/change-password/', views.ChangePasswordView.as_view(), name='change_password'),
+    path('api/change-password/', ChangePasswordView.as_view(), name='change_password'),
 
 ]
@@ -0,0 +1,62 @@
+"""
+Benchmarks of the password validators, the change-password serializer and
+endpoint. Run them from the app directory with ``python -m benchmarks``.
+"""
+import math
+import random
+import string
+import time
+
+PASSWORD_LENGTHS = (8, 64, 512, 4096)
+
+
+def make_password(length, seed=0):
+    """Return a reproducible password mixing every character class"""
+    rng = random.Random(seed + length)
+    alphabet = string.ascii_letters + string.digits + '@_!#$%^&*'
+    return ''.join(rng.choice(alphabet) for _ in range(length))
+
+
+def make_valid_password(length, seed=0):
+    """
+    Return a reproducible password passing the benchmark policies: blocks of
+    one lowercase, uppercase, digit and special character in a random order,
+    so no character or character type repeats more than twice in a row.
+    """
+    rng = random.Random(seed * 8191 + length)
+    classes = [string.ascii_lowercase, string.ascii_uppercase, string.digits, '@_!#$%^&*']
+    characters = []
+    while len(characters) < length:
+        rng.shuffle(classes)
+        characters.extend(rng.choice(alphabet) for alphabet in classes)
+    return ''.join(characters[:length])
+
+
+def percentile(timings, fraction):
+    index = min(len(timings) - 1, max(0, math.ceil(fraction * len(timings)) - 1))
+    return timings[index]
+
+
+def measure(func, min_time=0.2, min_iterations=5, max_iterations=100000):
+    """
+    Call func until both min_time seconds and min_iterations calls are
+    reached, after one warm-up call, and return its throughput and latency
+    percentiles.
+    """
+    func()
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_iterations:
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+        if len(timings) >= min_iterations and time.perf_counter() - started >= min_time:
+            break
+    timings.sort()
+    total = sum(timings)
+    return {
+        'iterations': len(timings),
+        'ops_per_sec': len(timings) / total if total else float('inf'),
+        'p50_us': percentile(timings, 0.50) * 1e6,
+        'p99_us': percentile(timings, 0.99) * 1e6,
+    }
@@ -0,0 +1,99 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+
+SUITES = ('validators', 'serializers', 'endpoints')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Run the password benchmarks.")
+    parser.add_argument('suites', nargs='*', metavar='suite',
+                        help="Suites to run among %s, all of them by default." % ', '.join(SUITES))
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    parser.add_argument('--baseline', help="Compare the results with a JSON file written by --output.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed ops/sec drop against the baseline, as a fraction.")
+    parser.add_argument('--min-time', type=float, default=0.2, help="Minimum seconds spent on each benchmark.")
+    parser.add_argument('--max-requests', type=int, default=20,
+                        help="Maximum change-password requests per benchmark.")
+    parser.add_argument('--allow-missing-index', action='store_true',
+                        help="Run without the password index, the breached password check is then skipped.")
+    args = parser.parse_args(argv)
+    for suite in args.suites:
+        if suite not in SUITES:
+            parser.error("unknown suite %r" % suite)
+    args.suites = args.suites or list(SUITES)
+    return args
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    from django.core.management import call_command
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+def compare(results, baseline, tolerance):
+    """Return the benchmarks slower than the baseline by more than the tolerance"""
+    regressions = {}
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if previous and result['ops_per_sec'] < previous['ops_per_sec'] * (1 - tolerance):
+            regressions[name] = {
+                'baseline_ops_per_sec': previous['ops_per_sec'],
+                'ops_per_sec': result['ops_per_sec'],
+                'change': result['ops_per_sec'] / previous['ops_per_sec'] - 1,
+            }
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    setup()
+    import django
+    from django.conf import settings
+    if not os.path.exists(settings.PASSWORD_INDEX_PATH):
+        message = "The password index %s does not exist, build it with `manage.py build_password_index`." % (
+            settings.PASSWORD_INDEX_PATH)
+        if not args.allow_missing_index:
+            print(message + " --allow-missing-index runs without it.", file=sys.stderr)
+            return 2
+        print("WARNING: %s The breached password check is skipped everywhere." % message, file=sys.stderr)
+    options = {'min_time': args.min_time, 'max_requests': args.max_requests}
+    results = {}
+    for suite in args.suites:
+        suite_results = importlib.import_module('benchmarks.%s' % suite).run(options)
+        for name, result in suite_results.items():
+            print("%-60s %12.1f ops/s  p50 %10.1f us  p99 %10.1f us" % (
+                name, result['ops_per_sec'], result['p50_us'], result['p99_us']))
+        results.update(suite_results)
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, regression in sorted(regressions.items()):
+            print("REGRESSION %s: %.1f -> %.1f ops/s (%+.0f%%)" % (
+                name, regression['baseline_ops_per_sec'], regression['ops_per_sec'], regression['change'] * 100))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
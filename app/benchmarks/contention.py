@@ -0,0 +1,175 @@
+"""
+SQLite write contention benchmark. Several processes change their user's
+password through ChangePasswordView against one database file for a fixed
+time, while a probe process writes a login token every few milliseconds like
+a concurrent login would. The committed password changes per second, the
+"database is locked" errors and the latency of the probe writes, which is
+mostly time spent waiting for the write lock, are reported for three modes:
+the SQLite defaults, settings.SQLITE_PRAGMAS, and the pragmas with the BEGIN
+IMMEDIATE backend.
+Run it from the app directory with ``python -m benchmarks.contention``,
+PASSWORD_HASHER_PARAMS tunes the cost of the hashes.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import make_valid_password, percentile
+
+DJANGO_ENGINE, IMMEDIATE_ENGINE = 'django.db.backends.sqlite3', 'core.backends.sqlite3'
+PASSWORD = 'Contention1!password'
+
+
+def setup(path, engine, pragmas):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    from django.conf import settings
+    settings.DATABASES['default'].update(ENGINE=engine, NAME=path)
+    settings.SQLITE_PRAGMAS = pragmas
+    django.setup()
+    from django.db.backends.signals import connection_created
+    from core.database import configure_sqlite
+    connection_created.connect(configure_sqlite, dispatch_uid='core.configure_sqlite')
+
+
+def worker(path, engine, pragmas, user_id, duration, start_at, results):
+    """Change the password of a user through ChangePasswordView until the deadline"""
+    setup(path, engine, pragmas)
+    from django.db import OperationalError
+    from rest_framework.test import APIClient
+    from core.models import PasswordPolicy, User
+
+    client = APIClient()
+    client.force_authenticate(User.objects.get(pk=user_id))
+    policy_id = PasswordPolicy.objects.get(user_id=user_id, status=True).pk
+    counter = itertools.count()
+    password = PASSWORD
+    committed = locked = 0
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = start_at + duration
+    while time.time() < deadline:
+        new_password = make_valid_password(16, seed=next(counter))
+        try:
+            response = client.put('/api/change-password/', {
+                'old_password': password, 'new_password': new_password, 'policy_id': policy_id,
+            }, format='json')
+        except OperationalError:
+            locked += 1
+            # The view changed the hash of the in-memory user before failing.
+            client.force_authenticate(User.objects.get(pk=user_id))
+            continue
+        if response.status_code != 200:
+            raise RuntimeError("Changing the password failed with %d: %s" % (response.status_code, response.data))
+        password = new_password
+        committed += 1
+    results.put((committed, locked, None))
+
+
+def probe(path, engine, pragmas, user_id, duration, start_at, interval, results):
+    """Replace a login token of a user every interval seconds and time each write transaction"""
+    setup(path, engine, pragmas)
+    from django.db import OperationalError, transaction
+    from rest_framework.authtoken.models import Token
+
+    timings = []
+    locked = 0
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = start_at + duration
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                Token.objects.filter(user_id=user_id).delete()
+                Token.objects.create(user_id=user_id)
+            timings.append(time.perf_counter() - start)
+        except OperationalError:
+            locked += 1
+        time.sleep(interval)
+    results.put((0, locked, timings))
+
+
+def run_once(workers, duration, engine, pragmas, probe_interval):
+    """Return the password changes per second, locked errors and probe write timings of one run"""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'contention.sqlite3')
+    from django.core.management import call_command
+    from django.db import connections
+    from core.models import PasswordPolicy, User
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = path
+    settings.SQLITE_PRAGMAS = pragmas
+    connections.close_all()
+    call_command('migrate', verbosity=0)
+    users = [User.objects.create_user(email='contention%d@example.com' % index, password=PASSWORD)
+             for index in range(workers + 1)]
+    for user in users:
+        PasswordPolicy.objects.create(name='Default', user=user, status=True, pwd_history=3)
+    connections.close_all()
+    probe_user = users.pop()
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    start_at = time.time() + 2
+    processes = [
+        context.Process(target=worker, args=(path, engine, pragmas, user.pk, duration, start_at, results))
+        for user in users
+    ]
+    processes.append(context.Process(
+        target=probe, args=(path, engine, pragmas, probe_user.pk, duration, start_at, probe_interval, results),
+    ))
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+    timings = sorted(next(timings for committed, locked, timings in totals if timings is not None))
+    return (sum(committed for committed, locked, timings in totals) / duration,
+            sum(locked for committed, locked, timings in totals), timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.contention',
+                                     description="Measure SQLite write throughput across worker processes.")
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 2, 4, 8], help="Worker process counts.")
+    parser.add_argument('--duration', type=float, default=3, help="Seconds each run writes for.")
+    parser.add_argument('--probe-interval', type=float, default=0.01, help="Seconds between two probe writes.")
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    from app.settings import SQLITE_PRAGMAS
+    pragmas = SQLITE_PRAGMAS or {'journal_mode': 'wal', 'synchronous': 'normal', 'busy_timeout': 5000}
+    setup(':memory:', DJANGO_ENGINE, {})
+    results = {}
+    for mode, engine, mode_pragmas in (('default', DJANGO_ENGINE, {}), ('pragmas', DJANGO_ENGINE, pragmas),
+                                       ('immediate', IMMEDIATE_ENGINE, pragmas)):
+        for workers in args.workers:
+            tps, locked, timings = run_once(workers, args.duration, engine, mode_pragmas, args.probe_interval)
+            name = 'contention.change_password[mode=%s,workers=%d]' % (mode, workers)
+            results[name] = {
+                'tx_per_sec': tps,
+                'locked': locked,
+                'probe_p50_ms': percentile(timings, 0.50) * 1e3 if timings else None,
+                'probe_p99_ms': percentile(timings, 0.99) * 1e3 if timings else None,
+                'probe_max_ms': timings[-1] * 1e3 if timings else None,
+            }
+            print("%-60s %8.1f tx/s  %6d locked  probe p50 %8.1f ms  p99 %8.1f ms  max %8.1f ms" % (
+                name, tps, locked, results[name]['probe_p50_ms'] or 0, results[name]['probe_p99_ms'] or 0,
+                results[name]['probe_max_ms'] or 0))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results}, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import itertools
+
+from django.conf import settings
+from rest_framework.test import APIClient
+
+from benchmarks import PASSWORD_LENGTHS, make_valid_password, measure
+from core.models import PasswordPolicy, User
+
+
+def run(options, lengths=PASSWORD_LENGTHS):
+    user = User.objects.create_user(email='endpoints.bench@example.com', password='Bench1!password')
+    policy = PasswordPolicy.objects.create(name='Benchmark', user=user, min_length=8,
+                                           max_length=settings.PASSWORD_MAX_LENGTH, pwd_history=3, status=True)
+    client = APIClient()
+    client.force_authenticate(user)
+    counter = itertools.count()
+    current = {'password': 'Bench1!password'}
+    results = {}
+    for length in lengths:
+        def change_password():
+            new_password = make_valid_password(length, seed=next(counter))
+            response = client.put('/api/change-password/', {
+                'old_password': current['password'],
+                'new_password': new_password,
+                'policy_id': policy.pk,
+            }, format='json')
+            if response.status_code != 200:
+                raise RuntimeError("Changing to a password of length %d failed with %d: %s" % (
+                    length, response.status_code, response.data))
+            current['password'] = new_password
+
+        results['endpoints.change_password[len=%d]' % length] = measure(
+            change_password, min_time=options['min_time'], max_iterations=options['max_requests'],
+        )
+    return results
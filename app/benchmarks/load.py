@@ -0,0 +1,284 @@
+"""
+Load test of the WSGI and ASGI deployments. The app is served by gunicorn
+with threads (app/wsgi.py) and by uvicorn (app/asgi.py, async views) on a
+new SQLite database file, and each client logs in, reads /api/user/me/ or
+changes its password over one keep-alive connection as fast as it can.
+--slow-clients more connections send a login request one body byte at a
+time, like clients on a bad network: each one holds a thread of the WSGI
+server for as long as it sends, an ASGI server only keeps their buffers.
+Run it from the app directory with ``python -m benchmarks.load``, gunicorn
+and uvicorn must be installed. PASSWORD_HASHER_PARAMS is passed on to the
+servers.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import percentile
+
+HOST = '127.0.0.1'
+PASSWORD = 'Load1!password'
+SCENARIOS = ('login', 'me', 'change_password')
+
+
+def server_command(server, port, args):
+    if server == 'wsgi':
+        return [sys.executable, '-m', 'gunicorn', 'app.wsgi:application', '--bind', '%s:%d' % (HOST, port),
+                '--worker-class', 'gthread', '--workers', str(args.workers), '--threads', str(args.threads),
+                '--worker-connections', str(args.max_concurrency + args.slow_clients + 100),
+                '--log-level', 'warning']
+    return [sys.executable, '-m', 'uvicorn', 'app.asgi:application', '--host', HOST, '--port', str(port),
+            '--workers', str(args.workers), '--lifespan', 'off', '--no-access-log', '--log-level', 'warning']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def create_database(path, users):
+    """Migrate a new database file and create the users of the clients, all with PASSWORD"""
+    from django.conf import settings
+    from django.contrib.auth.hashers import make_password
+    from django.core.management import call_command
+    from django.db import connections
+    from core.models import PasswordPolicy, User
+    settings.DATABASES['default']['NAME'] = path
+    connections.close_all()
+    call_command('migrate', verbosity=0)
+    encoded = make_password(PASSWORD)
+    created = User.objects.bulk_create([
+        User(email='load%d@example.com' % index, password=encoded) for index in range(users)
+    ])
+    if created and created[0].pk is None:
+        created = User.objects.order_by('pk')
+    PasswordPolicy.objects.bulk_create([PasswordPolicy.default_for(user) for user in created])
+    connections.close_all()
+
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client connection"""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, token=None):
+        """Send a request and return its status and decoded JSON body"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(HOST, self.port)
+        data = json.dumps(body).encode() if body is not None else b''
+        headers = ['%s %s HTTP/1.1' % (method, path), 'Host: %s:%d' % (HOST, self.port),
+                   'Content-Type: application/json', 'Content-Length: %d' % len(data)]
+        if token:
+            headers.append('Authorization: Token %s' % token)
+        self.writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode() + data)
+        try:
+            status, content = await self.read_response()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.close()
+            raise
+        return status, json.loads(content) if content else None
+
+    async def read_response(self):
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = dict(line.lower().split(': ', 1) for line in lines[1:] if ': ' in line)
+        if headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).strip(), 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                chunks.append(chunk[:-2])
+            content = b''.join(chunks)
+        else:
+            content = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection') == 'close':
+            self.close()
+        return status, content
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class Client:
+    """One user running a scenario over its own connection"""
+
+    def __init__(self, index, port, scenario):
+        self.email = 'load%d@example.com' % index
+        self.password = PASSWORD
+        self.connection = Connection(port)
+        self.scenario = scenario
+        self.token = None
+        self.counter = itertools.count()
+        self.timings = []
+        self.errors = 0
+
+    async def timed(self, method, path, body=None, token=None):
+        start = time.perf_counter()
+        try:
+            status, content = await self.connection.request(method, path, body, token)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            status, content = None, None
+        self.timings.append(time.perf_counter() - start)
+        if status is None or status >= 400:
+            self.errors += 1
+            content = None
+        return content
+
+    async def login(self):
+        content = await self.timed('POST', '/api/login/', {'username': self.email, 'password': self.password})
+        self.token = content['token'] if content else None
+
+    async def step(self):
+        if self.scenario == 'login' or self.token is None:
+            await self.login()
+        elif self.scenario == 'me':
+            await self.timed('GET', '/api/user/me/', token=self.token)
+        else:
+            new_password = '%s%d' % (PASSWORD, next(self.counter))
+            content = await self.timed('PUT', '/api/change-password/', {
+                'old_password': self.password, 'new_password': new_password,
+                'policy_id': self.policy_id,
+            }, token=self.token)
+            if content is not None:
+                # The tokens of the user are deleted, log in again next step.
+                self.password, self.token = new_password, None
+
+    async def run(self, deadline):
+        if self.scenario != 'login':
+            await self.login()
+            if self.scenario == 'change_password':
+                status, content = await self.connection.request('GET', '/api/password_policy/', token=self.token)
+                self.policy_id = content['results'][0]['id']
+            self.timings.clear()
+            self.errors = 0
+        while time.perf_counter() < deadline:
+            await self.step()
+        self.connection.close()
+
+
+async def slow_client(port, deadline, interval):
+    """Send login requests one body byte every interval seconds until the deadline"""
+    while time.perf_counter() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(HOST, port)
+            body = json.dumps({'username': 'slow@example.com', 'password': 'x' * 32}).encode()
+            writer.write(('POST /api/login/ HTTP/1.1\r\nHost: %s:%d\r\nContent-Type: application/json\r\n'
+                          'Content-Length: %d\r\n\r\n' % (HOST, port, len(body))).encode())
+            for byte in body:
+                if time.perf_counter() >= deadline:
+                    break
+                writer.write(bytes([byte]))
+                await writer.drain()
+                await asyncio.sleep(interval)
+            writer.close()
+        except ConnectionError:
+            await asyncio.sleep(interval)
+
+
+async def load(port, scenario, concurrency, duration, slow_clients, slow_interval):
+    deadline = time.perf_counter() + duration
+    clients = [Client(index, port, scenario) for index in range(concurrency)]
+    slow = [asyncio.ensure_future(slow_client(port, deadline, slow_interval)) for _ in range(slow_clients)]
+    started = time.perf_counter()
+    await asyncio.gather(*[client.run(deadline) for client in clients])
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*slow)
+    timings = sorted(timing for client in clients for timing in client.timings)
+    return {
+        'requests': len(timings),
+        'errors': sum(client.errors for client in clients),
+        'req_per_sec': len(timings) / elapsed,
+        'p50_ms': percentile(timings, 0.50) * 1e3 if timings else None,
+        'p99_ms': percentile(timings, 0.99) * 1e3 if timings else None,
+    }
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The server exited with status %d." % process.returncode)
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("The server did not start in %d seconds." % timeout)
+
+
+def run_once(server, scenario, concurrency, args):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'load.sqlite3')
+    create_database(path, concurrency)
+    port = free_port()
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings', BENCHMARK_DATABASE=path,
+               ASYNC_VIEWS='1' if server == 'asgi' else '0')
+    process = subprocess.Popen(server_command(server, port, args), env=env)
+    try:
+        wait_for_port(port, process)
+        return asyncio.run(load(port, scenario, concurrency, args.duration, args.slow_clients, args.slow_interval))
+    finally:
+        process.terminate()
+        process.wait()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.load',
+                                     description="Compare the WSGI and ASGI deployments under load.")
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help="Scenarios to run among %s, all of them by default." % ', '.join(SCENARIOS))
+    parser.add_argument('--servers', nargs='*', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[10, 100, 1000],
+                        help="Numbers of concurrent clients.")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds each run sends requests for.")
+    parser.add_argument('--workers', type=int, default=1, help="Server worker processes.")
+    parser.add_argument('--threads', type=int, default=8, help="Threads of each WSGI worker process.")
+    parser.add_argument('--slow-clients', type=int, default=0,
+                        help="Connections sending a request one byte at a time during each run.")
+    parser.add_argument('--slow-interval', type=float, default=0.1, help="Seconds between the bytes of slow clients.")
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    for scenario in args.scenarios:
+        if scenario not in SCENARIOS:
+            parser.error("unknown scenario %r" % scenario)
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    args.max_concurrency = max(args.concurrency)
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    import django
+    django.setup()
+    results = {}
+    for scenario in args.scenarios:
+        for concurrency in args.concurrency:
+            for server in args.servers:
+                result = run_once(server, scenario, concurrency, args)
+                name = 'load.%s[server=%s,concurrency=%d,slow=%d]' % (scenario, server, concurrency, args.slow_clients)
+                results[name] = result
+                print("%-60s %8.1f req/s  p50 %8.1f ms  p99 %8.1f ms  %6d errors" % (
+                    name, result['req_per_sec'], result['p50_ms'] or 0, result['p99_ms'] or 0, result['errors']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results}, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,29 @@
+from django.conf import settings
+
+from benchmarks import PASSWORD_LENGTHS, make_valid_password, measure
+from core.models import PasswordPolicy, User
+from user.serializers import ChangePasswordSerializer
+
+
+def run(options, lengths=PASSWORD_LENGTHS):
+    user = User.objects.create_user(email='serializers.bench@example.com', password='Bench1!password')
+    policy = PasswordPolicy.objects.create(
+        name='Benchmark', user=user, min_length=8, max_length=settings.PASSWORD_MAX_LENGTH, min_number=2,
+        min_lowercase=2, min_uppercase=2, min_special_char=2, min_different_char=6, max_consecutive_char=3,
+        max_consecutive_char_type=3, pwd_history=3, status=True,
+    )
+    results = {}
+    for length in lengths:
+        data = {
+            'old_password': 'Bench1!password', 'new_password': make_valid_password(length), 'policy_id': policy.pk,
+        }
+
+        def validate():
+            serializer = ChangePasswordSerializer(data=data, context={'user': user, 'policy': policy})
+            if not serializer.is_valid():
+                raise RuntimeError("The benchmark password of length %d is rejected: %s" % (length, serializer.errors))
+
+        results['serializers.ChangePasswordSerializer[len=%d]' % length] = measure(
+            validate, min_time=options['min_time'],
+        )
+    return results
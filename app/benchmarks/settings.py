@@ -0,0 +1,25 @@
+import os
+
+from app.settings import *  # noqa
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        # Shared in-memory database, so the hashing threads see it as well.
+        'NAME': 'file:benchmarks?mode=memory&cache=shared',
+    }
+}
+
+# A database file shared with the servers of the load test.
+if os.environ.get('BENCHMARK_DATABASE'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': os.environ['BENCHMARK_DATABASE'],
+        }
+    }
+
+DEBUG = False
+
+# The benchmarks change the same user's password over and over.
+REST_FRAMEWORK = dict(REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={})
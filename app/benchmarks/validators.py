@@ -0,0 +1,66 @@
+from django.contrib.auth import password_validation
+from django.core.exceptions import ValidationError
+
+from benchmarks import PASSWORD_LENGTHS, make_password, measure
+from core.models import User
+from user import validation
+
+
+def get_validators(user):
+    """
+    Return (name, validator, user) for every validator class of user.validation,
+    then the chain of all of them and the CompiledPolicy doing the same checks.
+    """
+    validators = [
+        ('MaximumLengthValidator', validation.MaximumLengthValidator(), None),
+        ('MinimumLengthValidator', validation.MinimumLengthValidator(8), None),
+        ('UserAttributeSimilarityValidator', validation.UserAttributeSimilarityValidator(), user),
+        ('BreachedPasswordValidator', validation.BreachedPasswordValidator(), None),
+        ('PasswordHistoryValidator', validation.PasswordHistoryValidator(3), user),
+        ('MinimumNumberValidator', validation.MinimumNumberValidator(2), None),
+        ('MinimumLowerCaseValidator', validation.MinimumLowerCaseValidator(2), None),
+        ('MinimumUpperCaseValidator', validation.MinimumUpperCaseValidator(2), None),
+        ('MinimumSpecialValidator', validation.MinimumSpecialValidator(2), None),
+        ('MinimumDifferentValidator', validation.MinimumDifferentValidator(6), None),
+        ('MaximumRepeatingValidator', validation.MaximumRepeatingValidator(3), None),
+        ('MaximumRepeatingTypeValidator', validation.MaximumRepeatingTypeValidator(3), None),
+    ]
+    return validators + [
+        ('ValidatorChain', ValidatorChain([validator for name, validator, validator_user in validators]), user),
+        ('CompiledPolicy', validation.CompiledPolicy(
+            min_length=8, min_number=2, min_lowercase=2, min_uppercase=2, min_special_char=2,
+            min_different_char=6, max_consecutive_char=3, max_consecutive_char_type=3, pwd_history=3,
+        ), user),
+    ]
+
+
+class ValidatorChain:
+    """The validators run one after the other, as before CompiledPolicy"""
+
+    def __init__(self, validators):
+        self.validators = validators
+
+    def validate(self, password, user=None):
+        password_validation.validate_password(password, user, self.validators)
+
+
+def validate(validator, password, user):
+    try:
+        validator.validate(password, user)
+    except ValidationError:
+        pass
+
+
+def run(options, lengths=PASSWORD_LENGTHS):
+    user = User.objects.create_user(
+        email='validators.bench@example.com', password='Bench1!password',
+        first_name='Validators', last_name='Bench', company_name='Benchmarks Inc',
+    )
+    results = {}
+    for name, validator, validator_user in get_validators(user):
+        for length in lengths:
+            password = make_password(length)
+            results['validators.%s[len=%d]' % (name, length)] = measure(
+                lambda: validate(validator, password, validator_user), min_time=options['min_time'],
+            )
+    return results
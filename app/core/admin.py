@@ -14,7 +14,7 @@ class UserAdmin(BaseUserAdmin):
         (None, {'fields': ('email', 'password')}),
         (_('Personal Info'), {'fields': ('first_name', 'last_name', 'company_name', 'country', 'require_password_change', 'preferred_language')}),
         (_('Permissions'), {'fields': ('is_active', 'is_staff', 'is_superuser')}),
-        (_('Important_dates'), {'fields': ('last_login',)}),
+        (_('Important_dates'), {'fields': ('last_login', 'password_changed_at', 'password_expires_at')}),
     )
     add_fieldsets = (
         (None, {
@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from core.database import install_query_observer
+        connection_created.connect(install_query_observer, dispatch_uid='core.install_query_observer')
+        if getattr(settings, 'SQLITE_PRAGMAS', None):
+            from core.database import configure_sqlite
+            connection_created.connect(configure_sqlite, dispatch_uid='core.configure_sqlite')
+        if getattr(settings, 'DATABASE_HEALTH_CHECKS', False):
+            from core.database import check_connections, mark_connections_used
+            request_started.connect(check_connections, dispatch_uid='core.check_connections')
+            request_finished.connect(mark_connections_used, dispatch_uid='core.mark_connections_used')
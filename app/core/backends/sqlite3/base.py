@@ -0,0 +1,14 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend starting transactions with BEGIN IMMEDIATE.
+    A deferred transaction that reads before it writes fails at once with
+    "database is locked" when another connection wrote in the meantime,
+    busy_timeout doesn't apply to it. Taking the write lock when the
+    transaction starts makes it wait for the lock instead.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,139 @@
+"""
+Database connection helpers: SQLite tuning, health checks of persistent
+connections, query observers, routing of selected reads to replicas and
+database access from async views.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import SyncToAsync
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+# Set while a view runs whose reads may be served by a replica.
+replica_reads = ContextVar('replica_reads', default=False)
+
+# Callables receiving the (alias, sql, seconds) of every query run in the
+# current context. A context variable rather than a connection wrapper, so
+# the queries an async view runs through sync_to_async are seen as well.
+query_observers = ContextVar('query_observers', default=())
+
+
+def check_connections(**kwargs):
+    """
+    Close the persistent connections that stopped working, for instance
+    after a database restart or a failover, so the request opens new ones
+    instead of failing on its first query. Only the connections idle for
+    more than settings.DATABASE_HEALTH_CHECK_IDLE seconds are checked, one
+    that fails sooner is closed by Django at the end of the failed request.
+    """
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if now - getattr(connection, 'health_check_last_used', 0) > settings.DATABASE_HEALTH_CHECK_IDLE \
+                and not connection.is_usable():
+            connection.close()
+
+
+def mark_connections_used(**kwargs):
+    """Record the end of the request as the last use of the open connections"""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.health_check_last_used = now
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Run settings.SQLITE_PRAGMAS on every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute('PRAGMA %s = %s' % (name, value))
+
+
+def observe_queries(execute, sql, params, many, context):
+    """Execute wrapper reporting the query to the current query_observers"""
+    observers = query_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for observer in observers:
+            observer(context['connection'].alias, sql, duration)
+
+
+def install_query_observer(sender, connection, **kwargs):
+    """Add observe_queries to the execute wrappers of every new connection"""
+    if observe_queries not in connection.execute_wrappers:
+        # First, so the pop() of a temporary execute_wrapper() leaves it in place.
+        connection.execute_wrappers.insert(0, observe_queries)
+
+
+class ReplicaRouter:
+    """
+    Send the reads of views using ReplicaReadMixin to a random database of
+    settings.DATABASE_REPLICAS, everything else to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaReadMixin:
+    """
+    Viewset mixin serving the reads of `replica_actions` from the replicas.
+    Authentication still reads the default database, so a token created
+    just before is found.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        token = replica_reads.set(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            replica_reads.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions:
+            replica_reads.set(True)
+
+
+class DatabaseSyncToAsync(SyncToAsync):
+    """
+    sync_to_async for code using the database, which runs on the executor
+    threads instead of the single thread of thread_sensitive=True, so the
+    queries and password checks of concurrent async requests don't wait on
+    each other. The connections of the thread are closed before and after
+    when they are obsolete or broken, as around every sync request.
+    """
+
+    def __init__(self, func, thread_sensitive=False):
+        super().__init__(func, thread_sensitive=thread_sensitive)
+
+    def thread_handler(self, loop, *args, **kwargs):
+        close_old_connections()
+        try:
+            return super().thread_handler(loop, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+
+database_sync_to_async = DatabaseSyncToAsync
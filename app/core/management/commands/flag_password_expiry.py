@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import User
+
+
+class Command(BaseCommand):
+    """Flag users whose password expires soon or has expired"""
+
+    help = "Set password_expiry_warning on expiring passwords and require_password_change on expired ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Number of users updated per query.")
+        parser.add_argument('--dry-run', action='store_true', help="Count the users without updating them.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = self.flag(
+            User.objects.filter(password_expires_at__lte=now, require_password_change=False),
+            'require_password_change', 'password_expires_at', options['chunk_size'], options['dry_run'],
+        )
+        expiring = self.flag(
+            User.objects.filter(password_warn_at__lte=now, password_expires_at__gt=now, password_expiry_warning=False),
+            'password_expiry_warning', 'password_warn_at', options['chunk_size'], options['dry_run'],
+        )
+        self.stdout.write(self.style.SUCCESS("%d expired and %d expiring passwords flagged." % (expired, expiring)))
+
+    def flag(self, queryset, field, date_field, chunk_size, dry_run):
+        """
+        set a boolean field on the users of a queryset, one chunk at a time in
+        (date_field, pk) order so that each chunk is a range of the date index
+        """
+        total, last = 0, None
+        while True:
+            chunk = queryset
+            if last is not None:
+                chunk = chunk.filter(Q(**{date_field + '__gt': last[0]}) | Q(**{date_field: last[0], 'pk__gt': last[1]}))
+            users = list(chunk.order_by(date_field, 'pk').only('pk', date_field)[:chunk_size])
+            if not users:
+                return total
+            for user in users:
+                setattr(user, field, True)
+            if not dry_run:
+                User.objects.bulk_update(users, [field])
+            total += len(users)
+            last = (getattr(users[-1], date_field), users[-1].pk)
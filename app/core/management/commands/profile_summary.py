@@ -0,0 +1,86 @@
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    """Summarize the request samples saved by ProfilingMiddleware"""
+
+    help = "Print the hottest functions, queries and timings across the saved request profiles."
+
+    def add_arguments(self, parser):
+        options = dict(profiling.DEFAULT_OPTIONS, **getattr(settings, 'PROFILING', {}))
+        parser.add_argument('--directory', default=options['DIRECTORY'], help="Directory of the saved samples.")
+        parser.add_argument('--view', help="Only summarize the samples of this URL name.")
+        parser.add_argument('--reason', choices=['sampled', 'slow'],
+                            help="Only summarize the samples saved for this reason.")
+        parser.add_argument('--sort', choices=['self', 'cumulative'], default='self',
+                            help="Rank the functions by their own time or by the time spent below them.")
+        parser.add_argument('--limit', type=int, default=20, help="Number of rows of each table.")
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['directory']):
+            raise CommandError("%s does not exist." % options['directory'])
+        samples = [
+            sample for sample in profiling.read_samples(options['directory'])
+            if (options['view'] is None or sample['view'] == options['view'])
+            and (options['reason'] is None or sample['reason'] == options['reason'])
+        ]
+        if not samples:
+            self.stdout.write("No samples.")
+            return
+
+        durations = sorted(sample['duration'] for sample in samples)
+        self.stdout.write("%d samples, duration median %.3fs, max %.3fs" % (
+            len(samples), durations[len(durations) // 2], durations[-1]))
+        views = defaultdict(list)
+        for sample in samples:
+            views[sample['view']].append(sample['duration'])
+        for view, view_durations in sorted(views.items(), key=lambda item: -sum(item[1])):
+            self.stdout.write("  %-40s %5d samples %9.3fs" % (view, len(view_durations), sum(view_durations)))
+
+        # function key -> [samples, calls, self seconds, cumulative seconds]
+        functions = defaultdict(lambda: [0, 0, 0.0, 0.0])
+        queries = defaultdict(lambda: [0, 0.0])
+        observations = defaultdict(lambda: [0, 0.0, 0.0])
+        for sample in samples:
+            for key, calls, self_time, cumulative_time in sample['functions']:
+                total = functions[tuple(key)]
+                total[0] += 1
+                total[1] += calls or 0
+                total[2] += self_time
+                total[3] += cumulative_time
+            for alias, sql, duration in sample['queries']:
+                total = queries[(alias, sql)]
+                total[0] += 1
+                total[1] += duration
+            for name, labelvalues, value in sample['observations']:
+                total = observations[(name, tuple(labelvalues))]
+                total[0] += 1
+                total[1] += value
+                total[2] = max(total[2], value)
+
+        column = 2 if options['sort'] == 'self' else 3
+        self.stdout.write("\nHottest functions (by %s time)" % options['sort'])
+        self.stdout.write("%9s %9s %9s %7s  %s" % ('self', 'cumul', 'calls', 'samples', 'function'))
+        for (filename, line, name), (count, calls, self_time, cumulative_time) in sorted(
+                functions.items(), key=lambda item: -item[1][column])[:options['limit']]:
+            self.stdout.write("%8.3fs %8.3fs %9s %7d  %s:%d(%s)" % (
+                self_time, cumulative_time, calls or '-', count, filename, line, name))
+
+        self.stdout.write("\nSlowest queries (by total time)")
+        self.stdout.write("%9s %7s  %s" % ('total', 'count', 'query'))
+        for (alias, sql), (count, duration) in sorted(
+                queries.items(), key=lambda item: -item[1][1])[:options['limit']]:
+            self.stdout.write("%8.3fs %7d  [%s] %s" % (duration, count, alias, sql))
+
+        self.stdout.write("\nTimings (by total time)")
+        self.stdout.write("%9s %9s %7s  %s" % ('total', 'max', 'count', 'metric'))
+        for (name, labelvalues), (count, total, maximum) in sorted(
+                observations.items(), key=lambda item: -item[1][1])[:options['limit']]:
+            self.stdout.write("%8.3fs %8.3fs %7d  %s %s" % (
+                total, maximum, count, name, ' '.join(map(str, labelvalues))))
@@ -0,0 +1,270 @@
+"""
+In process metrics in the Prometheus text exposition format.
+Counters and histograms are kept per process. An observation is a bisect and
+a few increments under an uncontended lock, so the instrumentation stays on
+in production. /metrics only answers direct requests from the networks of
+settings.METRICS_ALLOWED_NETWORKS.
+A scrape reaches one worker of a multi-process server. With
+settings.METRICS_DIRECTORY set, every process writes its values to a file of
+that directory each METRICS_WRITE_INTERVAL seconds and at exit, and /metrics
+adds up the files of all the processes, the ones that exited included so
+their counts don't go backwards. Empty the directory when the server starts.
+Without it, /metrics only exposes the values of the worker that answers.
+"""
+import atexit
+import ipaddress
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Seconds, from a fast validator to a slow key derivation function.
+DEFAULT_BUCKETS = (.00001, .00005, .0001, .0005, .001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+REGISTRY = []
+
+# List collecting the (metric name, label values, value) observations of the
+# current context, set while a request is profiled.
+recorded_observations = ContextVar('recorded_observations', default=None)
+
+
+def format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def collect(self):
+        """Return a copy of the values of this process, by label values"""
+        with self.lock:
+            return {labelvalues: self.copy_value(value) for labelvalues, value in self.values.items()}
+
+    def render(self, values):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s %s' % (self.name, self.type)]
+        lines.extend(self.render_value(labelvalues, value) for labelvalues, value in sorted(values.items()))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Monotonic count, per label values"""
+    type = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        if directory is not None and writer_pid != os.getpid():
+            start_writer()
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def copy_value(self, value):
+        return value
+
+    def merge_value(self, value, other):
+        return value + other
+
+    def render_value(self, labelvalues, value):
+        return '%s_total%s %s' % (self.name, format_labels(self.labelnames, labelvalues), format_value(value))
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets, per label values"""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        if directory is not None and writer_pid != os.getpid():
+            start_writer()
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labelvalues)
+            if state is None:
+                # bucket counts, then the +Inf bucket, then the sum
+                state = self.values[labelvalues] = [0] * (len(self.buckets) + 1) + [0]
+            state[index] += 1
+            state[-1] += value
+        recorded = recorded_observations.get()
+        if recorded is not None:
+            recorded.append((self.name, labelvalues, value))
+
+    def time(self, *labelvalues):
+        return Timer(self, labelvalues)
+
+    def copy_value(self, state):
+        return list(state)
+
+    def merge_value(self, state, other):
+        return [count + other_count for count, other_count in zip(state, other)]
+
+    def render_value(self, labelvalues, state):
+        lines, total = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), state):
+            total += count
+            lines.append('%s_bucket%s %d' % (
+                self.name, format_labels(self.labelnames, labelvalues, [('le', format_value(bound))]), total))
+        labels = format_labels(self.labelnames, labelvalues)
+        lines.append('%s_sum%s %s' % (self.name, labels, format_value(state[-1])))
+        lines.append('%s_count%s %d' % (self.name, labels, total))
+        return '\n'.join(lines)
+
+
+class Timer:
+    """Context manager observing the seconds spent in its block"""
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+directory = getattr(settings, 'METRICS_DIRECTORY', None)
+# Process the writer thread runs in and file it writes, set again in a forked child.
+writer_pid = writer_path = None
+writer_lock = threading.Lock()
+
+
+def collect():
+    """Return the values of every metric of this process, by metric name"""
+    return {metric.name: metric.collect() for metric in REGISTRY}
+
+
+def write_values():
+    """Save the values of this process to its file of the metrics directory"""
+    data = {name: [[list(labelvalues), value] for labelvalues, value in values.items()]
+            for name, values in collect().items()}
+    with open(writer_path + '.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(writer_path + '.tmp', writer_path)
+
+
+def run_writer(pid):
+    while writer_pid == pid:
+        time.sleep(getattr(settings, 'METRICS_WRITE_INTERVAL', 1))
+        write_values()
+
+
+def write_at_exit(pid):
+    if writer_pid == pid:
+        write_values()
+
+
+def start_writer():
+    """Start writing the values of this process, once per process"""
+    global writer_pid, writer_path
+    with writer_lock:
+        pid = os.getpid()
+        if writer_pid == pid:
+            return
+        os.makedirs(directory, exist_ok=True)
+        # Not named after the pid alone, a new process could reuse the one of an exited process.
+        writer_path = os.path.join(directory, 'metrics-%d-%s.json' % (pid, uuid.uuid4().hex[:8]))
+        writer_pid = pid
+        threading.Thread(target=run_writer, args=(pid,), name='metrics-writer', daemon=True).start()
+        atexit.register(write_at_exit, pid)
+
+
+def read_values(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        # being replaced
+        return {}
+
+
+def render():
+    values = collect()
+    if directory is not None and os.path.isdir(directory):
+        metrics = {metric.name: metric for metric in REGISTRY}
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.endswith('.json') or (writer_pid == os.getpid() and path == writer_path):
+                continue
+            for metric_name, entries in read_values(path).items():
+                metric = metrics.get(metric_name)
+                if metric is None:
+                    continue
+                for labelvalues, value in entries:
+                    labelvalues = tuple(labelvalues)
+                    current = values[metric_name].get(labelvalues)
+                    values[metric_name][labelvalues] = value if current is None else metric.merge_value(current, value)
+    return '\n'.join(metric.render(values[metric.name]) for metric in REGISTRY) + '\n'
+
+
+# Parsed once, a malformed entry fails at startup rather than on every scrape.
+allowed_networks = [
+    ipaddress.ip_network(network.strip())
+    for network in getattr(settings, 'METRICS_ALLOWED_NETWORKS', ()) if network.strip()
+]
+
+
+def is_allowed(request):
+    """
+    Return whether a request comes from an allowed network. Requests that
+    went through a reverse proxy are refused, their REMOTE_ADDR is the proxy's.
+    """
+    if 'HTTP_X_FORWARDED_FOR' in request.META:
+        return False
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in network for network in allowed_networks)
+
+
+def metrics_view(request):
+    """Expose all the metrics, of every process when settings.METRICS_DIRECTORY is set"""
+    if not is_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+validator_seconds = Histogram(
+    'password_validator_seconds', "Time spent in each password validator or policy rule.", ['validator'])
+policy_validation_seconds = Histogram(
+    'password_policy_validation_seconds', "Time spent validating a password against a whole policy.")
+validation_errors = Counter(
+    'password_validation_errors', "Passwords rejected, by error code.", ['code'])
+hashing_seconds = Histogram(
+    'password_hashing_seconds', "Time spent hashing or checking passwords.", ['operation'])
+token_authentication_seconds = Histogram(
+    'token_authentication_seconds', "Time spent authenticating tokens.", ['source'])
+request_seconds = Histogram(
+    'http_request_seconds', "Request latency, by URL name.", ['view', 'method', 'status'])
+request_queries = Histogram(
+    'http_request_db_queries', "Database queries per request, by URL name.", ['view'], buckets=QUERY_BUCKETS)
@@ -0,0 +1,149 @@
+import asyncio
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+
+from core import metrics, profiling
+from core.database import query_observers
+
+
+class AsyncCapableMiddleware:
+    """
+    Base of the middlewares running in sync or async mode, like the rest of
+    the middleware chain. Subclasses implement __call__ and __acall__, and
+    __call__ returns self.__acall__(request) in async mode.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Tell the handler to await __call__
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+
+class RequestSizeLimitMiddleware(AsyncCapableMiddleware):
+    """
+    Reject request bodies larger than the limit of their path prefix, set in
+    settings.REQUEST_BODY_LIMITS, before anything parses or hashes them.
+    Bodies of undeclared length, sent with Transfer-Encoding: chunked, are
+    rejected on these paths too since their size is only known once read.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.limits = sorted(getattr(settings, 'REQUEST_BODY_LIMITS', {}).items(), key=lambda item: -len(item[0]))
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.reject(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.reject(request) or await self.get_response(request)
+
+    def reject(self, request):
+        """Return the 411 or 413 response of a body without length or too large, None otherwise"""
+        limit = self.get_limit(request.path_info)
+        if limit is not None:
+            if request.META.get('HTTP_TRANSFER_ENCODING') and not request.META.get('CONTENT_LENGTH'):
+                return JsonResponse({'detail': 'Content-Length required.'}, status=411)
+            try:
+                content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                content_length = 0
+            if content_length > limit:
+                return JsonResponse({'detail': 'Request body too large.'}, status=413)
+        return None
+
+    def get_limit(self, path):
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return None
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """Observe the latency and the number of database queries of every request"""
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = []
+        start = time.perf_counter()
+        token = query_observers.set(query_observers.get() + (lambda alias, sql, duration: queries.append(duration),))
+        try:
+            response = self.get_response(request)
+        finally:
+            query_observers.reset(token)
+        self.observe(request, response, time.perf_counter() - start, len(queries))
+        return response
+
+    async def __acall__(self, request):
+        queries = []
+        start = time.perf_counter()
+        token = query_observers.set(query_observers.get() + (lambda alias, sql, duration: queries.append(duration),))
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_observers.reset(token)
+        self.observe(request, response, time.perf_counter() - start, len(queries))
+        return response
+
+    def observe(self, request, response, duration, queries):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match.route) if match else 'unmatched'
+        metrics.request_seconds.observe(duration, view, request.method, response.status_code)
+        metrics.request_queries.observe(queries, view)
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """
+    Profile a fraction of the requests, or the requests slower than a
+    threshold, as set in settings.PROFILING, see core.profiling.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.options = dict(profiling.DEFAULT_OPTIONS, **getattr(settings, 'PROFILING', {}))
+        if not self.options['ENABLED']:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        sampled = random.random() < self.options['SAMPLE_RATE']
+        if not sampled and self.options['SLOW_THRESHOLD'] is None:
+            return self.get_response(request)
+        with profiling.Trace(profiling.get_profiler(self.options), self.options['MAX_QUERIES']) as trace:
+            response = self.get_response(request)
+        self.save(request, response, trace, sampled)
+        return response
+
+    async def __acall__(self, request):
+        sampled = random.random() < self.options['SAMPLE_RATE']
+        if not sampled and self.options['SLOW_THRESHOLD'] is None:
+            return await self.get_response(request)
+        # The event loop thread runs all the requests, they are not profiled.
+        with profiling.Trace(None, self.options['MAX_QUERIES']) as trace:
+            response = await self.get_response(request)
+        self.save(request, response, trace, sampled)
+        return response
+
+    def save(self, request, response, trace, sampled):
+        if not sampled and trace.duration < self.options['SLOW_THRESHOLD']:
+            return
+        match = getattr(request, 'resolver_match', None)
+        sample = trace.sample(
+            method=request.method,
+            path=request.path,
+            view=(match.view_name or match.route) if match else 'unmatched',
+            status=response.status_code,
+            reason='sampled' if sampled else 'slow',
+        )
+        profiling.write_sample(self.options['DIRECTORY'], sample, self.options['MAX_SAMPLES'])
@@ -0,0 +1,28 @@
+# Generated by Django 3.1 on 2026-10-18 10:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_auto_20210121_1245'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PasswordHistory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='password_history', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='passwordhistory',
+            index=models.Index(fields=['user', 'created'], name='core_passwo_user_id_7779e1_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_auto_20261018_1053'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='password_changed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Password changed at'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='password_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Password expires at'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='password_expiry_warning',
+            field=models.BooleanField(default=False, verbose_name='Password expiry warning'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='password_warn_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Password warning at'),
+        ),
+    ]
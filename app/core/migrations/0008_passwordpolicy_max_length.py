@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_auto_20261018_1054'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passwordpolicy',
+            name='max_length',
+            field=models.IntegerField(default=128),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_passwordpolicy_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passwordpolicy',
+            name='validation_mode',
+            field=models.CharField(choices=[('full', 'Report every violation'), ('collect_all', 'Skip the expensive checks once a rule failed'), ('fail_fast', 'Stop at the first violation')], default='full', max_length=20),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1 on 2026-10-18 11:10
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def keep_latest_active_policy(apps, schema_editor):
+    """deactivate all but the last updated active policy of each user"""
+    PasswordPolicy = apps.get_model('core', 'PasswordPolicy')
+    users = PasswordPolicy.objects.filter(status=True).values('user').annotate(active=Count('id')) \
+        .filter(active__gt=1).values_list('user', flat=True)
+    for user_id in users:
+        latest = PasswordPolicy.objects.filter(user_id=user_id, status=True).latest('last_updated', 'id')
+        PasswordPolicy.objects.filter(user_id=user_id, status=True).exclude(pk=latest.pk).update(status=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_passwordpolicy_validation_mode'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_active_policy, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='passwordpolicy',
+            index=models.Index(fields=['user', 'status'], name='core_passwo_user_id_7abf46_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='passwordpolicy',
+            constraint=models.UniqueConstraint(condition=models.Q(status=True), fields=('user',), name='one_active_policy_per_user'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def backfill_password_expiry(apps, schema_editor):
+    """
+    compute the password expiry dates of the users created before they existed,
+    from their last login or else from now since the change date is unknown.
+    One update per distinct expiry and warning interval of the active policies.
+    """
+    User = apps.get_model('core', 'User')
+    PasswordPolicy = apps.get_model('core', 'PasswordPolicy')
+    User.objects.filter(password_changed_at__isnull=True).update(
+        password_changed_at=Coalesce(F('last_login'), Value(timezone.now())))
+    intervals = PasswordPolicy.objects.filter(status=True, exp_interval__gt=0) \
+        .values_list('exp_interval', 'warn_interval').distinct()
+    for exp_interval, warn_interval in intervals:
+        User.objects.filter(
+            password_expires_at__isnull=True, password_policy__status=True,
+            password_policy__exp_interval=exp_interval, password_policy__warn_interval=warn_interval,
+        ).update(
+            password_expires_at=F('password_changed_at') + timedelta(days=exp_interval),
+            password_warn_at=F('password_changed_at') + timedelta(days=exp_interval - warn_interval),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_auto_20261018_1110'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_password_expiry, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,15 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.auth.models import (AbstractBaseUser,
                                         BaseUserManager,
                                         PermissionsMixin)
 from django.conf import settings
-from pycountry import countries
 
-COUNTRY_CHOICES = tuple((country.name, country.name) for country in countries)
+from core import metrics
+from core.countries import COUNTRY_CHOICES
 
 
 class UserManager(BaseUserManager):
@@ -42,6 +45,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     country = models.CharField(_('Country'), max_length=50, choices=COUNTRY_CHOICES, null=True, blank=True)
     require_password_change = models.BooleanField(_('Require password change'), default=False)
     preferred_language = models.CharField(_('Preferred language'), max_length=50, default='English')
+    password_changed_at = models.DateTimeField(_('Password changed at'), null=True, blank=True)
+    password_expires_at = models.DateTimeField(_('Password expires at'), null=True, blank=True, db_index=True)
+    password_warn_at = models.DateTimeField(_('Password warning at'), null=True, blank=True, db_index=True)
+    password_expiry_warning = models.BooleanField(_('Password expiry warning'), default=False)
 
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
@@ -49,15 +56,52 @@ class User(AbstractBaseUser, PermissionsMixin):
     objects = UserManager()
 
     USERNAME_FIELD = "email"
+    PASSWORD_EXPIRY_FIELDS = ['password_changed_at', 'password_expires_at', 'password_warn_at',
+                              'password_expiry_warning']
+
+    def set_password(self, raw_password):
+        with metrics.hashing_seconds.time('make'):
+            super().set_password(raw_password)
+        self.password_changed_at = timezone.now()
+        self.password_expiry_warning = False
+
+    def update_password_expiry(self, policy):
+        """compute the password expiry and warning dates from the active password policy"""
+        if policy is None or not policy.exp_interval or not self.password_changed_at:
+            self.password_expires_at = self.password_warn_at = None
+        else:
+            self.password_expires_at = self.password_changed_at + timedelta(days=policy.exp_interval)
+            self.password_warn_at = self.password_expires_at - timedelta(days=policy.warn_interval)
+
+
+class PasswordPolicyManager(models.Manager):
+
+    def deactivate(self, user, exclude=None):
+        """deactivate the active policy of a user, except the `exclude` one"""
+        return self.filter(user=user, status=True).exclude(pk=exclude).update(status=False)
+
+    def activate(self, user, policy_id):
+        """make a policy the only active one of its user"""
+        with transaction.atomic(using=self.db, savepoint=False):
+            self.deactivate(user, exclude=policy_id)
+            return self.filter(user=user, pk=policy_id).update(status=True)
 
 
 class PasswordPolicy(models.Model):
     """password policy model"""
 
+    FULL, COLLECT_ALL, FAIL_FAST = 'full', 'collect_all', 'fail_fast'
+    VALIDATION_MODE_CHOICES = (
+        (FULL, _('Report every violation')),
+        (COLLECT_ALL, _('Skip the expensive checks once a rule failed')),
+        (FAIL_FAST, _('Stop at the first violation')),
+    )
+
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='password_policy')
     min_number = models.IntegerField(default=0)
     min_length = models.IntegerField(default=8)
+    max_length = models.IntegerField(default=128)
     min_lowercase = models.IntegerField(default=0)
     min_uppercase = models.IntegerField(default=0)
     min_special_char = models.IntegerField(default=0)
@@ -68,8 +112,49 @@ class PasswordPolicy(models.Model):
     warn_interval = models.IntegerField(default=10)
     pwd_history = models.IntegerField(default=7)
     contains_username = models.BooleanField(default=False)
+    validation_mode = models.CharField(max_length=20, choices=VALIDATION_MODE_CHOICES, default=FULL)
     status = models.BooleanField(default=False)
     last_updated = models.DateTimeField(auto_now=True)
 
+    objects = PasswordPolicyManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user'], condition=models.Q(status=True), name='one_active_policy_per_user'),
+        ]
+
     def __str__(self):
         return "{} - {}".format(self.user, self.name)
+
+    @classmethod
+    def default_for(cls, user):
+        """unsaved default password policy given to a new user"""
+        return cls(name='Default', min_length=8, status=True, user=user)
+
+
+class PasswordHistoryManager(models.Manager):
+
+    def record(self, user, password, keep):
+        """store a previous password hash and trim the history to the last `keep` hashes"""
+        if keep > 0:
+            self.create(user=user, password=password)
+        stale = self.filter(user=user).order_by('-created', '-id').values_list('id', flat=True)[max(keep, 0):]
+        self.filter(user=user, id__in=stale).delete()
+
+
+class PasswordHistory(models.Model):
+    """previous password hashes of a user"""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='password_history')
+    password = models.CharField(_('password'), max_length=128)
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = PasswordHistoryManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created']),
+        ]
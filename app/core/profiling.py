@@ -0,0 +1,212 @@
+"""
+Opt-in profiling of sampled and slow requests.
+A traced request records its SQL queries and the metric observations made
+while it runs, e.g. the validator and hashing timings, and is profiled with
+cProfile or with a stack sampler. It is saved as a JSON file in the
+PROFILING['DIRECTORY'] when it was picked by PROFILING['SAMPLE_RATE'] or took
+longer than PROFILING['SLOW_THRESHOLD'] seconds, the oldest files are removed
+past PROFILING['MAX_SAMPLES'].
+cProfile slows the whole request down, so it suits a small sample rate. The
+stack sampler costs little per request, it is the one to use with a
+threshold since every request is then traced in case it turns out slow.
+Async requests share the event loop thread, their samples only hold the
+queries and timings.
+"""
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from core import metrics
+from core.database import query_observers
+
+DEFAULT_OPTIONS = {
+    'ENABLED': False,
+    'PROFILER': 'sampler',
+    'SAMPLE_RATE': 0.0,
+    'SLOW_THRESHOLD': None,
+    'INTERVAL': 0.005,
+    'DIRECTORY': 'profiles',
+    'MAX_SAMPLES': 200,
+    'MAX_QUERIES': 1000,
+}
+
+
+def function_key(code):
+    """Return the (file name, first line number, function name) of a code object"""
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+class CProfiler:
+    """Deterministic profile of the calls made by the current thread"""
+    name = 'cprofile'
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        """Return (function key, calls, self seconds, cumulative seconds) tuples"""
+        self.profile.disable()
+        stats = pstats.Stats(self.profile).stats
+        return [(key, calls, total_time, cumulative_time)
+                for key, (primitive_calls, calls, total_time, cumulative_time, callers) in stats.items()]
+
+
+class StackSampler:
+    """
+    Statistical profile of registered threads. One daemon thread reads the
+    stack of every registered thread each `interval` seconds, a function gets
+    `interval` seconds of self time when it is on top of a sampled stack and
+    of cumulative time when it is anywhere in it.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.threads = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def register(self, thread_id):
+        with self.lock:
+            self.threads[thread_id] = Counter()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+                self.thread.start()
+
+    def unregister(self, thread_id):
+        with self.lock:
+            return self.threads.pop(thread_id, Counter())
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.threads:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self.threads.items():
+                    frame = frames.get(thread_id)
+                    stack = []
+                    while frame is not None:
+                        stack.append(function_key(frame.f_code))
+                        frame = frame.f_back
+                    if stack:
+                        stacks[tuple(stack)] += 1
+
+
+class SampledProfiler:
+    """Stack sampler profile of the current thread"""
+    name = 'sampler'
+    samplers = {}
+
+    def __init__(self, interval):
+        sampler = self.samplers.get(interval)
+        if sampler is None:
+            sampler = self.samplers.setdefault(interval, StackSampler(interval))
+        self.sampler = sampler
+        self.thread_id = threading.get_ident()
+
+    def start(self):
+        self.sampler.register(self.thread_id)
+
+    def stop(self):
+        """Return (function key, calls, self seconds, cumulative seconds) tuples, calls are unknown"""
+        stacks = self.sampler.unregister(self.thread_id)
+        self_samples, cumulative_samples = Counter(), Counter()
+        for stack, count in stacks.items():
+            self_samples[stack[0]] += count
+            for key in set(stack):
+                cumulative_samples[key] += count
+        interval = self.sampler.interval
+        return [(key, None, self_samples[key] * interval, count * interval)
+                for key, count in cumulative_samples.items()]
+
+
+def get_profiler(options):
+    if options['PROFILER'] == 'cprofile':
+        return CProfiler()
+    return SampledProfiler(options['INTERVAL'])
+
+
+class Trace:
+    """Context manager recording the queries, observations and profile of the code it runs"""
+
+    def __init__(self, profiler=None, max_queries=1000):
+        self.profiler = profiler
+        self.max_queries = max_queries
+        self.queries = []
+        self.observations = []
+        self.functions = []
+
+    def record_query(self, alias, sql, duration):
+        if len(self.queries) < self.max_queries:
+            self.queries.append((alias, sql, duration))
+
+    def __enter__(self):
+        self.tokens = (
+            query_observers.set(query_observers.get() + (self.record_query,)),
+            metrics.recorded_observations.set(self.observations),
+        )
+        self.timestamp, self.start = time.time(), time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler is not None:
+            self.functions = self.profiler.stop()
+        self.duration = time.perf_counter() - self.start
+        query_observers.reset(self.tokens[0])
+        metrics.recorded_observations.reset(self.tokens[1])
+
+    def sample(self, **info):
+        """Return the JSON serializable sample of the trace with extra info"""
+        return dict(info, **{
+            'timestamp': self.timestamp,
+            'duration': self.duration,
+            'profiler': self.profiler.name if self.profiler is not None else None,
+            'functions': self.functions,
+            'queries': self.queries,
+            'observations': self.observations,
+        })
+
+
+def write_sample(directory, sample, max_samples):
+    """Save a sample as a JSON file and remove the oldest ones past max_samples"""
+    os.makedirs(directory, exist_ok=True)
+    timestamp = sample['timestamp']
+    name = '%s.%06d-%d-%d.json' % (
+        time.strftime('%Y%m%dT%H%M%S', time.gmtime(timestamp)), timestamp % 1 * 1000000, os.getpid(),
+        threading.get_ident())
+    path = os.path.join(directory, name)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(sample, f)
+    os.replace(path + '.tmp', path)
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in names[:max(len(names) - max_samples, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            # removed by another process
+            pass
+    return path
+
+
+def read_samples(directory):
+    """Yield the samples saved in a directory, oldest first"""
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                yield json.load(f)
+        except (FileNotFoundError, ValueError):
+            # rotated away or unreadable
+            continue
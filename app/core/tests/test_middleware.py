@@ -0,0 +1,29 @@
+from django.test import SimpleTestCase, override_settings
+
+LIMITS = {'/api/login/': 64, '/api/user/': 128, '/api/user/import/': 1024}
+
+
+@override_settings(REQUEST_BODY_LIMITS=LIMITS)
+class RequestSizeLimitTests(SimpleTestCase):
+
+    def test_too_large(self):
+        response = self.client.post('/api/login/', 'x' * 65, content_type='application/json')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json(), {'detail': 'Request body too large.'})
+
+    def test_longest_prefix_applies(self):
+        response = self.client.post('/api/user/import/', 'x' * 512, content_type='text/csv')
+        self.assertNotEqual(response.status_code, 413)
+        response = self.client.post('/api/user/import/', 'x' * 1025, content_type='text/csv')
+        self.assertEqual(response.status_code, 413)
+
+    def test_chunked_body(self):
+        response = self.client.post('/api/login/', '{}', content_type='application/json',
+                                    HTTP_TRANSFER_ENCODING='chunked', CONTENT_LENGTH='')
+        self.assertEqual(response.status_code, 411)
+        self.assertEqual(response.json(), {'detail': 'Content-Length required.'})
+
+    def test_other_paths_are_not_limited(self):
+        response = self.client.post('/api/password_policy/', 'x' * 1024, content_type='application/json',
+                                    HTTP_TRANSFER_ENCODING='chunked')
+        self.assertNotIn(response.status_code, (411, 413))
@@ -0,0 +1,51 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import PasswordPolicy, User
+
+
+class CursorPaginationTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email='admin@example.com', password='Admin#Pass123')
+        User.objects.bulk_create([User(email='user%d@example.com' % i) for i in range(7)])
+        PasswordPolicy.objects.bulk_create([
+            PasswordPolicy(name='Policy %d' % i, user=self.admin, status=i == 0) for i in range(5)
+        ])
+        self.client.force_authenticate(self.admin)
+
+    def pages(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages.append([item['id'] for item in response.data['results']])
+            url = response.data['next']
+        return pages
+
+    def test_users(self):
+        pages = self.pages('/api/user/?page_size=3')
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual(sum(pages, []), list(User.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_previous_page(self):
+        response = self.client.get('/api/user/?page_size=3')
+        response = self.client.get(response.data['next'])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         list(User.objects.order_by('id').values_list('id', flat=True)[:3]))
+
+    def test_filtered_policies(self):
+        pages = self.pages('/api/password_policy/?page_size=2&status=false')
+        self.assertEqual([len(page) for page in pages], [2, 2])
+        self.assertEqual(sum(pages, []), list(PasswordPolicy.objects.filter(status=False).order_by('id')
+                                              .values_list('id', flat=True)))
+
+    def test_max_page_size(self):
+        response = self.client.get('/api/user/?page_size=5000')
+        self.assertEqual(len(response.data['results']), 8)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/user/?cursor=invalid')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,43 @@
+import asyncio
+
+from core.database import database_sync_to_async
+
+
+class AsyncAPIViewMixin:
+    """
+    Run a DRF view or viewset as a Django async view, for handlers written
+    as coroutines. Authentication, permission and throttle checks run in
+    a database thread, the handler in the event loop, where it awaits
+    database_sync_to_async() calls and the hashing pool. Sync handlers
+    still work.
+    """
+
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        view = super().as_view(*args, **kwargs)
+        # Tell Django the view returns a coroutine
+        view._is_coroutine = asyncio.coroutines._is_coroutine
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        """Same as APIView.dispatch, awaiting the checks and the handler"""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await database_sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
@@ -0,0 +1,34 @@
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline delimited JSON lazily, one value per line.
+    Lines that are not valid JSON are returned as None.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return (self.parse_line(line) for line in stream if line.strip())
+
+    def parse_line(self, line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+
+class CSVParser(BaseParser):
+    """
+    Parses CSV with a header row lazily, one dict per row.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        return csv.DictReader(codecs.iterdecode(stream, encoding))
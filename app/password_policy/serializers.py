@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from core.models import PasswordPolicy
 
@@ -7,7 +8,34 @@ class PasswordPolicySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = PasswordPolicy
-        fields = ('id', 'name', 'user', 'min_length', 'min_number', 'min_lowercase', 'min_uppercase',
+        fields = ('id', 'name', 'user', 'min_length', 'max_length', 'min_number', 'min_lowercase', 'min_uppercase',
                   'min_special_char', 'min_different_char', 'max_consecutive_char', 'max_consecutive_char_type',
-                  'exp_interval', 'warn_interval', 'pwd_history', 'contains_username', 'status', 'last_updated')
+                  'exp_interval', 'warn_interval', 'pwd_history', 'contains_username', 'validation_mode', 'status',
+                  'last_updated')
         read_only_fields = ('id', 'user')
+        extra_kwargs = {
+            'max_length': {'min_value': 1, 'max_value': settings.PASSWORD_MAX_LENGTH},
+        }
+
+    def validate(self, attrs):
+        """reject a policy no password can pass, partial updates keep the other length"""
+        current = self.instance or PasswordPolicy()
+        min_length = attrs.get('min_length', current.min_length)
+        max_length = attrs.get('max_length', current.max_length)
+        if max_length < min_length:
+            raise serializers.ValidationError({'max_length': 'Must be greater than or equal to min_length.'})
+        return attrs
+
+
+class PasswordPolicyFilterSerializer(serializers.Serializer):
+    """serializer for the query parameters filtering password policy listings"""
+
+    status = serializers.BooleanField(required=False, allow_null=True, default=None)
+    user = serializers.IntegerField(required=False, min_value=1)
+
+
+class PasswordCheckSerializer(serializers.Serializer):
+    """serializer for a password candidate"""
+
+    password = serializers.CharField(allow_blank=True, trim_whitespace=False,
+                                     max_length=settings.PASSWORD_MAX_LENGTH)
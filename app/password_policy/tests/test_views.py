@@ -0,0 +1,93 @@
+import json
+from unittest import mock
+
+from django.db import IntegrityError
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import PasswordPolicy, PasswordPolicyManager, User
+
+
+class PasswordPolicyTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='jane@example.com', password='Old#Pass123')
+        self.policy = PasswordPolicy.default_for(self.user)
+        self.policy.save()
+        self.client.force_authenticate(self.user)
+
+    def test_create_active_policy(self):
+        response = self.client.post('/api/password_policy/', {'name': 'Strict', 'min_length': 12, 'status': True},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(list(PasswordPolicy.objects.filter(user=self.user, status=True).values_list('name', flat=True)),
+                         ['Strict'])
+
+    def test_max_length_below_min_length(self):
+        response = self.client.post('/api/password_policy/', {'name': 'Strict', 'min_length': 12, 'max_length': 10},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('max_length', response.data)
+        # Partial updates are checked against the stored min_length.
+        response = self.client.patch('/api/password_policy/%d/' % self.policy.pk, {'max_length': 6}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('max_length', response.data)
+        response = self.client.patch('/api/password_policy/%d/' % self.policy.pk, {'max_length': 8}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_concurrent_activation(self):
+        with mock.patch.object(PasswordPolicyManager, 'deactivate', return_value=0):
+            response = self.client.post('/api/password_policy/', {'name': 'Strict', 'status': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        policy = PasswordPolicy.objects.create(name='Strict', user=self.user)
+        with mock.patch.object(PasswordPolicyManager, 'deactivate', return_value=0):
+            response = self.client.patch('/api/password_policy/%d/' % policy.pk, {'status': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(list(PasswordPolicy.objects.filter(user=self.user, status=True)), [self.policy])
+
+    def test_constraint_violation_is_a_conflict(self):
+        with mock.patch.object(PasswordPolicyManager, 'deactivate', side_effect=IntegrityError):
+            response = self.client.post('/api/password_policy/', {'name': 'Strict', 'status': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def evaluate(self, data, content_type='application/json'):
+        return self.client.post('/api/password_policy/%d/evaluate/' % self.policy.pk, data,
+                                content_type=content_type)
+
+    def results(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_evaluate(self):
+        results = self.results(self.evaluate(json.dumps(['Abcdef1!x', 'short', 5])))
+        self.assertEqual(results, [
+            {'index': 0, 'valid': True, 'codes': []},
+            {'index': 1, 'valid': False, 'codes': ['password_too_short']},
+            {'index': 2, 'error': 'Expected a password string.'},
+        ])
+        results = self.results(self.evaluate(json.dumps({'passwords': ['short']})))
+        self.assertEqual(results, [{'index': 0, 'valid': False, 'codes': ['password_too_short']}])
+
+    def test_evaluate_ndjson(self):
+        results = self.results(self.evaluate('"Abcdef1!x"\n"short"\n', 'application/x-ndjson'))
+        self.assertEqual([result['valid'] for result in results], [True, False])
+
+    def test_evaluate_rejects_other_payloads(self):
+        for data in ('5', '{"passwords": 5}', '{"other": []}', '"password"'):
+            response = self.evaluate(data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+            self.assertIn('passwords', response.data)
+
+    def test_check(self):
+        response = self.client.post('/api/password_policy/%d/check/' % self.policy.pk, {'password': 'short'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['valid'])
+        self.assertIn({'code': 'password_too_short', 'passed': False}, response.data['rules'])
+
+    def test_other_users_policy(self):
+        other = User.objects.create_user(email='john@example.com', password='Old#Pass123')
+        policy = PasswordPolicy.default_for(other)
+        policy.save()
+        response = self.client.post('/api/password_policy/%d/evaluate/' % policy.pk, ['short'], format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
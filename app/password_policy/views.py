@@ -1,29 +1,136 @@
-from rest_framework import viewsets, mixins
-from core.models import PasswordPolicy
+import json
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from core.models import PasswordPolicy, User
+from core.database import ReplicaReadMixin
+from core.pagination import IdCursorPagination
 from password_policy import serializers
+from password_policy.parsers import NDJSONParser
+from user.validation import compiled_policies
 from . import permissions
 
 
-class passwordPolicyViewSet(viewsets.ModelViewSet):
+class PolicyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Another password policy was activated at the same time, please try again.'
+    default_code = 'conflict'
+
+
+class passwordPolicyViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """manage password policy database"""
 
     queryset = PasswordPolicy.objects.all()
     serializer_class = serializers.PasswordPolicySerializer
     permission_classes = [permissions.PasswordPolicyPermission, ]
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
-        if self.request.user.is_superuser:
-            return self.queryset
-        return self.queryset.filter(user=self.request.user)
+        queryset = self.queryset
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(user=self.request.user)
+        if self.action == 'list':
+            filters = serializers.PasswordPolicyFilterSerializer(data=self.request.query_params)
+            filters.is_valid(raise_exception=True)
+            if filters.validated_data.get('status') is not None:
+                queryset = queryset.filter(status=filters.validated_data['status'])
+            if 'user' in filters.validated_data:
+                queryset = queryset.filter(user_id=filters.validated_data['user'])
+        return queryset
 
     def perform_create(self, serializer):
         """create new password policy"""
-        if serializer.validated_data.get('status'):
-            PasswordPolicy.objects.filter(user=self.request.user).update(status=False)
-        serializer.save(user=self.request.user)
+        with self.activation(self.request.user.pk):
+            if serializer.validated_data.get('status'):
+                PasswordPolicy.objects.deactivate(self.request.user)
+            serializer.save(user=self.request.user)
+        compiled_policies.invalidate(serializer.instance.pk)
+        self.update_password_expiry(serializer.instance)
 
     def perform_update(self, serializer):
         """update password policy"""
-        if serializer.validated_data.get('status'):
-            PasswordPolicy.objects.filter(user=self.request.user).update(status=False)
-        serializer.save()
+        with self.activation(serializer.instance.user_id):
+            if serializer.validated_data.get('status'):
+                PasswordPolicy.objects.deactivate(serializer.instance.user_id, exclude=serializer.instance.pk)
+            serializer.save()
+        compiled_policies.invalidate(serializer.instance.pk)
+        self.update_password_expiry(serializer.instance)
+
+    @contextmanager
+    def activation(self, user_id):
+        """
+        Transaction locking the owner's row, like ChangePasswordView, so the
+        policy changes of a user run one after the other. A policy activated
+        concurrently anyway is reported as a conflict.
+        """
+        try:
+            with transaction.atomic():
+                User.objects.select_for_update().filter(pk=user_id).exists()
+                yield
+        except IntegrityError:
+            raise PolicyConflict()
+
+    def update_password_expiry(self, policy):
+        """recompute the owner's password expiry when its active policy changed"""
+        if policy.status:
+            user = policy.user
+            user.update_password_expiry(policy)
+            user.save(update_fields=user.PASSWORD_EXPIRY_FIELDS)
+
+    def perform_destroy(self, instance):
+        """delete password policy"""
+        compiled_policies.invalidate(instance.pk)
+        instance.delete()
+
+    @action(methods=('post',), detail=True, parser_classes=(JSONParser, NDJSONParser))
+    def evaluate(self, request, pk=None):
+        """
+        Evaluate a batch of passwords against the policy, without changing
+        anything. Accepts a JSON array (or {"passwords": [...]}) or an NDJSON
+        stream of passwords and streams back one NDJSON line per password.
+        """
+        policy = self.get_object()
+        passwords = request.data
+        if isinstance(passwords, dict):
+            passwords = passwords.get('passwords')
+        # A JSON list, or the lazy iterator of the NDJSON parser. Anything
+        # else is rejected now, once streaming started errors can't be reported.
+        if not isinstance(passwords, (list, Iterator)):
+            return Response({'passwords': 'Expected a list of passwords.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        def results():
+            for index, codes in enumerate(compiled_policies.get(policy).evaluate_many(passwords)):
+                if codes is None:
+                    yield json.dumps({'index': index, 'error': 'Expected a password string.'}) + '\n'
+                else:
+                    yield json.dumps({'index': index, 'valid': not codes, 'codes': codes}) + '\n'
+
+        return StreamingHttpResponse(results(), content_type='application/x-ndjson')
+
+    @action(methods=('post',), detail=True, serializer_class=serializers.PasswordCheckSerializer)
+    def check(self, request, pk=None):
+        """
+        Check a password candidate against the policy without hashing or
+        storing it. The client sends the full candidate on every request.
+        Returns the result of every rule and an entropy estimate.
+        """
+        policy = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        password = serializer.validated_data['password']
+
+        compiled = compiled_policies.get(policy)
+        results, stats = compiled.check(password, request.user)
+        return Response({
+            'valid': all(passed for code, passed in results),
+            'length': stats.length,
+            'entropy': round(compiled.entropy(stats), 1),
+            'rules': [{'code': code, 'passed': passed} for code, passed in results],
+        })
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class UserConfig(AppConfig):
     name = 'user'
+
+    def ready(self):
+        from user import authentication, hashers
+        hashers.check_password_hasher()
+        authentication.connect_signals()
@@ -0,0 +1,143 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import metrics
+
+
+class TokenCache:
+    """
+    Short lived cache of authenticated tokens.
+    Entries are kept in process for a few seconds and, when a cache alias
+    is configured, in a shared Django cache as well. They are stored
+    pickled, so every request gets its own copy of the user object.
+    """
+
+    def __init__(self, ttl=5, max_size=10000, cache_alias=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.cache_alias = cache_alias
+        self.entries = OrderedDict()
+        self.user_keys = {}
+        self.lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def cache_key(self, key):
+        return 'token-auth:%s' % key
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return pickle.loads(entry[2])
+        if self.shared is not None:
+            data = self.shared.get(self.cache_key(key))
+            if data is not None:
+                user, token = pickle.loads(data)
+                self.store(key, user.pk, data)
+                return user, token
+        return None
+
+    def set(self, key, user, token):
+        data = pickle.dumps((user, token))
+        self.store(key, user.pk, data)
+        if self.shared is not None:
+            self.shared.set(self.cache_key(key), data, self.ttl)
+
+    def store(self, key, user_id, data):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, user_id, data)
+            self.entries.move_to_end(key)
+            self.user_keys.setdefault(user_id, set()).add(key)
+            while len(self.entries) > self.max_size:
+                old_key, old_entry = self.entries.popitem(last=False)
+                self.forget(old_key, old_entry[1])
+
+    def forget(self, key, user_id):
+        """drop a key from the keys of its user, called with the lock held"""
+        keys = self.user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.user_keys[user_id]
+
+    def invalidate(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.forget(key, entry[1])
+        if self.shared is not None:
+            self.shared.delete(self.cache_key(key))
+
+    def token_keys(self, user_id):
+        """Return the token keys of a user the shared cache may hold"""
+        if self.shared is None:
+            return []
+        return list(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+    def invalidate_user(self, user_id, token_keys=()):
+        with self.lock:
+            keys = self.user_keys.pop(user_id, set())
+            for key in keys:
+                self.entries.pop(key, None)
+        if self.shared is not None:
+            keys = set(keys) | set(token_keys)
+            self.shared.delete_many([self.cache_key(key) for key in keys])
+
+
+token_cache = TokenCache(**{
+    key.lower(): value for key, value in getattr(settings, 'TOKEN_AUTHENTICATION_CACHE', {}).items()
+})
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that skips the token and user queries for tokens
+    seen in the last few seconds.
+    """
+
+    def authenticate_credentials(self, key):
+        start = time.perf_counter()
+        cached = token_cache.get(key)
+        if cached is not None:
+            metrics.token_authentication_seconds.observe(time.perf_counter() - start, 'cache')
+            return cached
+        try:
+            user, token = super().authenticate_credentials(key)
+        except AuthenticationFailed:
+            metrics.token_authentication_seconds.observe(time.perf_counter() - start, 'rejected')
+            raise
+        token_cache.set(key, user, token)
+        metrics.token_authentication_seconds.observe(time.perf_counter() - start, 'database')
+        return user, token
+
+
+# Invalidations run once the transaction commits, a request reading the token
+# before would otherwise cache it again for the TTL.
+
+def invalidate_token(sender, instance, **kwargs):
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.invalidate(key))
+
+
+def invalidate_user(sender, instance, **kwargs):
+    # The tokens may be deleted later in the transaction, look their keys up now.
+    user_id, token_keys = instance.pk, token_cache.token_keys(instance.pk)
+    transaction.on_commit(lambda: token_cache.invalidate_user(user_id, token_keys))
+
+
+def connect_signals():
+    post_delete.connect(invalidate_token, sender=Token, dispatch_uid='token_cache_invalidate_token')
+    post_save.connect(invalidate_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='token_cache_invalidate_user')
+    post_delete.connect(invalidate_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='token_cache_delete_user')
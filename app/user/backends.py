@@ -0,0 +1,77 @@
+import inspect
+
+from django.conf import settings
+from django.contrib.auth import _clean_credentials, _get_backends, get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_login_failed
+from django.core.exceptions import PermissionDenied
+
+from core.database import database_sync_to_async
+from user import hashing
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    Authenticate against the user model like ModelBackend, with the password
+    check run on the hashing pool and hash upgrades deferred to the background.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None or len(password) > settings.PASSWORD_MAX_LENGTH:
+            return
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user (#20760).
+            hashing.hash_password(password)
+        else:
+            if hashing.check_user_password(user, password) and self.user_can_authenticate(user):
+                return user
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        """
+        Async version of authenticate, the user is loaded in a database
+        thread and the event loop is free while the password is checked.
+        """
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None or len(password) > settings.PASSWORD_MAX_LENGTH:
+            return
+        try:
+            user = await database_sync_to_async(UserModel._default_manager.get_by_natural_key)(username)
+        except UserModel.DoesNotExist:
+            await hashing.ahash_password(password)
+        else:
+            if await hashing.acheck_user_password(user, password) and self.user_can_authenticate(user):
+                return user
+
+
+async def aauthenticate(request=None, **credentials):
+    """
+    Async version of django.contrib.auth.authenticate. Backends without an
+    aauthenticate method, and the user_login_failed receivers, run in a
+    database thread.
+    """
+    for backend, backend_path in _get_backends(return_tuples=True):
+        try:
+            inspect.signature(backend.authenticate).bind(request, **credentials)
+        except TypeError:
+            continue
+        try:
+            if hasattr(backend, 'aauthenticate'):
+                user = await backend.aauthenticate(request, **credentials)
+            else:
+                user = await database_sync_to_async(backend.authenticate)(request, **credentials)
+        except PermissionDenied:
+            break
+        if user is None:
+            continue
+        user.backend = backend_path
+        return user
+    await database_sync_to_async(user_login_failed.send)(
+        sender=__name__, credentials=_clean_credentials(credentials), request=request)
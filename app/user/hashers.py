@@ -0,0 +1,103 @@
+"""
+Password hashers with parameters taken from settings.PASSWORD_HASHER_PARAMS,
+so the cost of each algorithm can be tuned per deployment. The algorithm
+names are unchanged, hashes made with other parameters still verify and are
+upgraded after the next successful login.
+"""
+import base64
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+
+def get_params(name):
+    return getattr(settings, 'PASSWORD_HASHER_PARAMS', {}).get(name, {})
+
+
+def check_password_hasher():
+    """Fail at startup when the selected algorithm's optional package is missing"""
+    if getattr(settings, 'PASSWORD_HASHER', None) == 'argon2':
+        try:
+            import argon2  # noqa: F401
+        except ImportError:
+            raise ImproperlyConfigured(
+                "PASSWORD_HASHER=argon2 needs the argon2-cffi package, install requirements-argon2.txt.")
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2 + HMAC + SHA256 with configurable iterations"""
+    iterations = get_params('pbkdf2').get('iterations', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """argon2 with configurable time cost, memory cost and parallelism"""
+    time_cost = get_params('argon2').get('time_cost', hashers.Argon2PasswordHasher.time_cost)
+    memory_cost = get_params('argon2').get('memory_cost', hashers.Argon2PasswordHasher.memory_cost)
+    parallelism = get_params('argon2').get('parallelism', hashers.Argon2PasswordHasher.parallelism)
+
+
+class ScryptPasswordHasher(hashers.BasePasswordHasher):
+    """
+    Secure password hashing using the scrypt algorithm of the standard
+    library, encoded the same way as Django's own scrypt hasher.
+    """
+    algorithm = 'scrypt'
+    work_factor = get_params('scrypt').get('n', 2 ** 14)
+    block_size = get_params('scrypt').get('r', 8)
+    parallelism = get_params('scrypt').get('p', 1)
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        hash_ = hashlib.scrypt(
+            password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+            maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=64,
+        )
+        hash_ = base64.b64encode(hash_).decode('ascii').strip()
+        return '%s$%d$%s$%d$%d$%s' % (self.algorithm, n, salt, r, p, hash_)
+
+    def decode(self, encoded):
+        algorithm, n, salt, r, p, hash_ = encoded.split('$', 5)
+        assert algorithm == self.algorithm
+        return {
+            'algorithm': algorithm,
+            'work_factor': int(n),
+            'salt': salt,
+            'block_size': int(r),
+            'parallelism': int(p),
+            'hash': hash_,
+        }
+
+    def verify(self, password, encoded):
+        decoded = self.decode(encoded)
+        encoded_2 = self.encode(
+            password, decoded['salt'], decoded['work_factor'], decoded['block_size'], decoded['parallelism'],
+        )
+        return constant_time_compare(encoded, encoded_2)
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {
+            _('algorithm'): decoded['algorithm'],
+            _('work factor'): decoded['work_factor'],
+            _('block size'): decoded['block_size'],
+            _('parallelism'): decoded['parallelism'],
+            _('salt'): hashers.mask_hash(decoded['salt']),
+            _('hash'): hashers.mask_hash(decoded['hash']),
+        }
+
+    def must_update(self, encoded):
+        decoded = self.decode(encoded)
+        return (decoded['work_factor'], decoded['block_size'], decoded['parallelism']) != (
+            self.work_factor, self.block_size, self.parallelism)
+
+    def harden_runtime(self, password, encoded):
+        # The runtime for scrypt is determined by its parameters.
+        pass
@@ -0,0 +1,137 @@
+"""
+Password hashing helpers.
+The key derivation functions run on a bounded thread pool. They release the
+GIL, so checking several hashes runs them in parallel instead of one after
+the other, and a login spike can't run more of them at once than the pool
+has threads. Hashes made with outdated parameters are upgraded by a
+background thread after a successful check instead of in the request.
+The `a` prefixed coroutines wait for the pool without blocking the event
+loop, for the async views.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth import hashers
+from django.db import connection
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def timed(operation, func):
+    """Wrap a hashing function to observe its duration"""
+    def wrapper(*args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            metrics.hashing_seconds.observe(time.perf_counter() - start, operation)
+    return wrapper
+
+
+check_password = timed('check', hashers.check_password)
+make_password = timed('make', hashers.make_password)
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or os.cpu_count(),
+    thread_name_prefix='password-hashing',
+)
+
+
+def submit(func, *args):
+    """Run a function on the hashing pool in a copy of the caller's context"""
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+
+rehash_queue = queue.Queue(maxsize=getattr(settings, 'PASSWORD_REHASH_QUEUE_SIZE', 1000))
+_rehash_thread = None
+_rehash_lock = threading.Lock()
+
+
+def check_password_any(password, encoded_passwords):
+    """Return True if the password matches any of the encoded hashes"""
+    futures = [submit(check_password, password, encoded) for encoded in encoded_passwords]
+    try:
+        for future in as_completed(futures):
+            if future.result():
+                return True
+        return False
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _submit_user_password_check(user, raw_password):
+    encoded = user.password
+
+    def setter(raw_password):
+        schedule_rehash(user.pk, encoded, raw_password)
+
+    return submit(check_password, raw_password, encoded, setter)
+
+
+def check_user_password(user, raw_password):
+    """
+    Check the password of a user on the hashing pool. An outdated hash is
+    queued to be upgraded in the background.
+    """
+    return _submit_user_password_check(user, raw_password).result()
+
+
+async def acheck_user_password(user, raw_password):
+    """Async version of check_user_password"""
+    return await asyncio.wrap_future(_submit_user_password_check(user, raw_password))
+
+
+def hash_password(raw_password):
+    """Hash a password on the hashing pool"""
+    return submit(make_password, raw_password).result()
+
+
+async def ahash_password(raw_password):
+    """Async version of hash_password"""
+    return await asyncio.wrap_future(submit(make_password, raw_password))
+
+
+def schedule_rehash(user_id, encoded, raw_password):
+    """Queue the upgrade of a user's hash, dropped if the queue is full"""
+    _start_rehash_thread()
+    try:
+        rehash_queue.put_nowait((user_id, encoded, raw_password))
+    except queue.Full:
+        pass
+
+
+def _start_rehash_thread():
+    global _rehash_thread
+    if _rehash_thread is not None:
+        return
+    with _rehash_lock:
+        if _rehash_thread is None:
+            _rehash_thread = threading.Thread(target=_rehash_worker, name='password-rehash', daemon=True)
+            _rehash_thread.start()
+
+
+def _rehash_worker():
+    while True:
+        user_id, encoded, raw_password = rehash_queue.get()
+        try:
+            # Only replace the hash the password was checked against, so a
+            # password changed in the meantime is left alone.
+            get_user_model().objects.filter(pk=user_id, password=encoded).update(
+                password=make_password(raw_password)
+            )
+        except Exception:
+            logger.exception("Upgrading the password hash of user %s failed.", user_id)
+        finally:
+            connection.close()
+            rehash_queue.task_done()
@@ -0,0 +1,148 @@
+"""
+Bulk user import.
+Records are read as a stream and validated against the default password
+policy, then written one chunk at a time: the passwords of a chunk are
+hashed on a process pool and the users and their default policies are
+inserted with bulk_create in a single transaction. After every committed
+chunk the number of records read so far is reported, an interrupted import
+resumes from there. The pool is started once per process with spawn, a fork
+would copy the server's database connections and threads into the workers.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import User, PasswordPolicy
+from user.serializers import UserImportSerializer
+from user.validation import CompiledPolicy
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers):
+    """
+    Return the hashing process pool shared by the imports of this process.
+    Spawned workers start without Django, they set it up before importing
+    anything that needs the app registry.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=django.setup)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+atexit.register(shutdown_pool)
+
+
+class UserImporter:
+    """Import users from an iterable of dicts"""
+
+    def __init__(self, chunk_size=1000, workers=None):
+        self.chunk_size = chunk_size
+        self.workers = workers or getattr(settings, 'PASSWORD_IMPORT_WORKERS', None) or os.cpu_count()
+        self.default_policy = PasswordPolicy.default_for(None)
+        self.compiled_policy = CompiledPolicy.from_policy(self.default_policy)
+
+    def run(self, records, start=0):
+        """
+        Import the records after the first `start` ones and yield an event
+        for every rejected record, {"record", "email", "errors"}, and for every
+        committed chunk, {"processed", "created", "rejected"} where processed
+        is the number of records read from the beginning.
+        """
+        records = islice(enumerate(records, 1), start, None)
+        processed, created, rejected = start, 0, 0
+        pool = get_pool(self.workers)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return
+            users, passwords = [], []
+            for line, email, user, password, errors in self.validate_chunk(chunk):
+                if errors:
+                    rejected += 1
+                    yield {'record': line, 'email': email, 'errors': errors}
+                else:
+                    users.append(user)
+                    passwords.append(password)
+            if users:
+                try:
+                    hashes = pool.map(make_password, passwords,
+                                      chunksize=max(1, len(passwords) // (self.workers * 4)))
+                    self.save_chunk(users, hashes)
+                except BrokenProcessPool:
+                    # A worker died, the next import starts a new pool.
+                    shutdown_pool()
+                    raise
+            processed, created = chunk[-1][0], created + len(users)
+            yield {'processed': processed, 'created': created, 'rejected': rejected}
+
+    def validate_chunk(self, chunk):
+        """Yield (line, email, user, raw password, errors) for the records of a chunk"""
+        results = [(line, record) + self.validate_record(record) for line, record in chunk]
+        emails = [user.email for line, record, user, password, errors in results if not errors]
+        existing = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+        for line, record, user, password, errors in results:
+            if not errors:
+                if user.email in existing:
+                    errors = {'email': ['User with this Email already exists.']}
+                existing.add(user.email)
+            email = user.email if user else record.get('email') if isinstance(record, dict) else None
+            yield line, email, user, password, errors
+
+    def validate_record(self, record):
+        """Return (unsaved user, raw password, errors) of a record"""
+        if not isinstance(record, dict):
+            return None, None, {'non_field_errors': ['Expected an object.']}
+        serializer = UserImportSerializer(data={
+            key: value for key, value in record.items() if isinstance(key, str) and value not in ('', None)
+        })
+        if not serializer.is_valid():
+            return None, None, serializer.errors
+        data = dict(serializer.validated_data)
+        password = data.pop('password')
+        user = User(**data)
+        user.email = User.objects.normalize_email(user.email)
+        errors = self.compiled_policy.get_errors(password, user)
+        if errors:
+            return user, None, {'password': ValidationError(errors).messages}
+        return user, password, None
+
+    def save_chunk(self, users, hashes):
+        """Insert a chunk of users and their default password policies"""
+        now = timezone.now()
+        for user, encoded in zip(users, hashes):
+            user.password = encoded
+            user.password_changed_at = now
+            user.update_password_expiry(self.default_policy)
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            if users[0].pk is None:
+                # Only some databases return the primary keys of bulk inserts.
+                pks = dict(User.objects.filter(email__in=[user.email for user in users]).values_list('email', 'pk'))
+                for user in users:
+                    user.pk = pks[user.email]
+            PasswordPolicy.objects.bulk_create([PasswordPolicy.default_for(user) for user in users])
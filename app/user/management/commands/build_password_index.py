@@ -0,0 +1,42 @@
+from itertools import chain
+
+from django.conf import settings
+from django.contrib.auth import password_validation
+from django.core.management.base import BaseCommand
+
+from user import password_index
+
+
+class Command(BaseCommand):
+    """Build the common and breached password index used by BreachedPasswordValidator"""
+
+    help = "Build the memory-mapped index of common and breached passwords."
+
+    def add_arguments(self, parser):
+        parser.add_argument('passwords', nargs='*', help="Plain text word lists, one password per line (.gz allowed).")
+        parser.add_argument('--sha1', nargs='*', default=[],
+                            help="SHA-1 lists with lines like HEX[:count], as published by breach corpora.")
+        parser.add_argument('--django-common', action='store_true',
+                            help="Include the common password list shipped with Django.")
+        parser.add_argument('--output', default=settings.PASSWORD_INDEX_PATH, help="Index file to write.")
+        parser.add_argument('--false-positive-rate', type=float, default=0.01,
+                            help="False positive rate of the bloom filter.")
+        parser.add_argument('--chunk-size', type=int, default=5000000,
+                            help="Number of digests sorted in memory at once.")
+
+    def handle(self, *args, **options):
+        paths = list(options['passwords'])
+        if options['django_common']:
+            paths.append(str(password_validation.CommonPasswordValidator.DEFAULT_PASSWORD_LIST_PATH))
+        digests = chain(
+            (password_index.digest(password) for path in paths for password in password_index.read_passwords(path)),
+            *(password_index.read_sha1(path) for path in options['sha1'])
+        )
+        count = password_index.build_index(
+            digests,
+            options['output'],
+            false_positive_rate=options['false_positive_rate'],
+            chunk_size=options['chunk_size'],
+            progress=lambda total: self.stdout.write("%d passwords read" % total),
+        )
+        self.stdout.write(self.style.SUCCESS("Wrote %d passwords to %s" % (count, options['output'])))
@@ -0,0 +1,72 @@
+import codecs
+import csv
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user.importer import UserImporter
+
+
+class Command(BaseCommand):
+    """Bulk import users with their default password policy"""
+
+    help = "Import users from a CSV file with a header row or an NDJSON file, validated against the default policy."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, - reads standard input.")
+        parser.add_argument('--format', choices=('csv', 'ndjson'),
+                            help="Input format, guessed from the file extension by default.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Number of users inserted per transaction.")
+        parser.add_argument('--workers', type=int, help="Number of processes hashing the passwords.")
+        parser.add_argument('--start', type=int, default=0, help="Number of records to skip.")
+        parser.add_argument('--checkpoint',
+                            help="File keeping the number of imported records, an interrupted import started "
+                                 "again with the same checkpoint resumes after them.")
+
+    def handle(self, *args, **options):
+        path, checkpoint = options['path'], options['checkpoint']
+        input_format = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        start = options['start']
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                start = int(f.read().strip() or 0)
+            self.stdout.write("Resuming after %d records." % start)
+
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            if input_format == 'csv':
+                records = csv.DictReader(codecs.iterdecode(stream, 'utf-8'))
+            else:
+                records = (self.parse_line(line) for line in stream if line.strip())
+            importer = UserImporter(chunk_size=options['chunk_size'], workers=options['workers'])
+            processed = start
+            try:
+                for event in importer.run(records, start=start):
+                    if 'errors' in event:
+                        self.stderr.write("record %d (%s): %s" % (event['record'], event['email'],
+                                                                  json.dumps(event['errors'])))
+                        continue
+                    processed = event['processed']
+                    if checkpoint:
+                        self.save_checkpoint(checkpoint, processed)
+                    self.stdout.write("%(processed)d records read, %(created)d users created, "
+                                      "%(rejected)d rejected" % event)
+            except Exception as e:
+                raise CommandError("Import stopped after %d records: %s" % (processed, e))
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS("Imported %d records." % processed))
+
+    def parse_line(self, line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def save_checkpoint(self, path, processed):
+        with open(path + '.tmp', 'w') as f:
+            f.write(str(processed))
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,211 @@
+"""
+Compact on-disk index of common and breached passwords.
+
+The index is a single file made of a header, a bloom filter and the sorted
+8 byte prefixes of the SHA-1 digest of every password. It is built offline
+by the build_password_index management command and memory-mapped at
+runtime, so all the worker processes share one copy through the page cache.
+A rebuilt file is picked up within CHECK_INTERVAL seconds.
+A lookup checks the bloom filter first, which answers most misses without
+touching the prefix table, and confirms hits with a binary search.
+"""
+import gzip
+import hashlib
+import heapq
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PWIX'
+VERSION = 1
+# magic, version, number of bloom hashes, number of bloom bits, number of prefixes
+HEADER = struct.Struct('>4sIIQQ')
+PREFIX_SIZE = 8
+DIGEST_SIZE = 20
+
+# Seconds between two checks of an index file for a rebuild.
+CHECK_INTERVAL = 1.0
+
+
+def digest(password):
+    """Return the SHA-1 digest of a password given as str or bytes"""
+    if isinstance(password, str):
+        password = password.encode('utf-8')
+    return hashlib.sha1(password).digest()
+
+
+def bloom_positions(value, num_hashes, num_bits):
+    """Return the bloom filter bits of a digest using double hashing"""
+    h1 = int.from_bytes(value[8:16], 'big')
+    h2 = int.from_bytes(value[12:20], 'big') | 1
+    return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+
+def file_identity(stat):
+    """Return what changes when an index file is rebuilt, from its os.stat() result"""
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class PasswordIndex:
+    """Read-only view of a memory-mapped password index file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.identity = file_identity(os.fstat(f.fileno()))
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.num_hashes, self.num_bits, self.count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a password index." % path)
+        self.bloom_offset = HEADER.size
+        self.prefix_offset = self.bloom_offset + (self.num_bits + 7) // 8
+
+    def __contains__(self, password):
+        value = digest(password)
+        for position in bloom_positions(value, self.num_hashes, self.num_bits):
+            if not self.map[self.bloom_offset + position // 8] & (1 << (position % 8)):
+                return False
+        return self.find(value[:PREFIX_SIZE])
+
+    def find(self, prefix):
+        """Binary search a digest prefix in the sorted prefix table"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = self.prefix_offset + middle * PREFIX_SIZE
+            current = self.map[offset:offset + PREFIX_SIZE]
+            if current == prefix:
+                return True
+            if current < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        return False
+
+    def close(self):
+        self.map.close()
+
+
+# path -> (index or None, time of the next check of the file)
+_indexes = {}
+_missing = set()
+_indexes_lock = threading.Lock()
+
+
+def open_index(path):
+    """
+    Return the shared PasswordIndex of a path, or None if the file has not
+    been built yet. The file is checked every CHECK_INTERVAL seconds at
+    most, and mapped again when build_password_index replaced it. Lookups
+    running on the previous map keep it alive until they finish.
+    """
+    now = time.monotonic()
+    entry = _indexes.get(path)
+    if entry is not None and now < entry[1]:
+        return entry[0]
+    with _indexes_lock:
+        entry = _indexes.get(path)
+        if entry is not None and now < entry[1]:
+            return entry[0]
+        index = entry[0] if entry is not None else None
+        try:
+            identity = file_identity(os.stat(path))
+        except FileNotFoundError:
+            identity = index = None
+            if path not in _missing:
+                logger.warning("Password index %s not found, breached password check is disabled.", path)
+                _missing.add(path)
+        if identity is not None and (index is None or index.identity != identity):
+            index = PasswordIndex(path)
+            _missing.discard(path)
+        _indexes[path] = (index, now + CHECK_INTERVAL)
+    return index
+
+
+def read_passwords(path):
+    """Yield the passwords of a plain text word list, one per line"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def read_sha1(path):
+    """Yield the digests of a SHA-1 list with lines like ``HEX[:count]``"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        for line in f:
+            line = line.strip().split(b':', 1)[0]
+            if len(line) == DIGEST_SIZE * 2:
+                yield bytes.fromhex(line.decode('ascii'))
+
+
+def _write_chunk(chunk, directory):
+    chunk.sort()
+    f = tempfile.TemporaryFile(dir=directory)
+    f.write(b''.join(chunk))
+    f.seek(0)
+    return f
+
+
+def _read_chunk(f):
+    while True:
+        value = f.read(DIGEST_SIZE)
+        if not value:
+            return
+        yield value
+
+
+def build_index(digests, path, false_positive_rate=0.01, chunk_size=5000000, progress=None):
+    """
+    Build an index file from an iterable of SHA-1 digests.
+    Digests are sorted in chunks on disk and merged, so memory use is bounded
+    by the chunk size and the bloom filter. Return the number of distinct
+    prefixes written.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    chunks, chunk, total = [], [], 0
+    for value in digests:
+        chunk.append(value)
+        total += 1
+        if len(chunk) >= chunk_size:
+            chunks.append(_write_chunk(chunk, directory))
+            chunk = []
+            if progress:
+                progress(total)
+    if chunk:
+        chunks.append(_write_chunk(chunk, directory))
+
+    num_bits = max(64, int(-max(total, 1) * math.log(false_positive_rate) / math.log(2) ** 2))
+    num_hashes = max(1, round(num_bits / max(total, 1) * math.log(2)))
+    bloom = bytearray((num_bits + 7) // 8)
+
+    count = 0
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, num_hashes, num_bits, 0))
+        out.write(bloom)
+        previous = None
+        for value in heapq.merge(*[_read_chunk(f) for f in chunks]):
+            for position in bloom_positions(value, num_hashes, num_bits):
+                bloom[position // 8] |= 1 << (position % 8)
+            prefix = value[:PREFIX_SIZE]
+            if prefix != previous:
+                out.write(prefix)
+                previous = prefix
+                count += 1
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, num_hashes, num_bits, count))
+        out.write(bloom)
+    for f in chunks:
+        f.close()
+    os.replace(temp_path, path)
+    return count
@@ -12,3 +12,13 @@ class UserPermission(permissions.BasePermission):
         if (request.user.is_authenticated and view.action != 'destroy') or view.action == 'create':
             return True
         return False
+
+
+class SuperUserPermission(permissions.BasePermission):
+    """
+    User Permissions:
+    Only superusers are allowed.
+    """
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_superuser)
@@ -1,8 +1,14 @@
-from django.contrib.auth import get_user_model, password_validation
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core import exceptions
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.settings import api_settings
 
-from core.models import User
+from core.models import PasswordPolicy, User
+from user.backends import aauthenticate
+from user.validation import compiled_policies, validate_password
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -11,10 +17,12 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         fields = ('id', 'email', 'password', 'first_name', 'last_name', 'company_name',
-                  'country', 'require_password_change', 'preferred_language')
-        read_only_fields = ('id', )
+                  'country', 'require_password_change', 'preferred_language', 'password_expires_at',
+                  'password_expiry_warning')
+        read_only_fields = ('id', 'password_expires_at', 'password_expiry_warning')
         extra_kwargs = {
-            'password': {"style": {"input_type": "password"}, "write_only": True, }
+            'password': {"style": {"input_type": "password"}, "write_only": True,
+                         "max_length": settings.PASSWORD_MAX_LENGTH}
         }
 
     def create(self, validated_data):
@@ -27,25 +35,42 @@ class UserSerializer(serializers.ModelSerializer):
         user = super().update(instance, validated_data)
         if password:
             user.set_password(password)
-            user.save()
+            user.update_password_expiry(PasswordPolicy.objects.filter(user=user, status=True).first())
+            user.save(update_fields=['password'] + User.PASSWORD_EXPIRY_FIELDS)
         return user
 
     def validate_password(self, password):
         errors = dict()
         try:
-            password_validation.validate_password(password=password)
+            validate_password(password=password)
         except exceptions.ValidationError as e:
             raise serializers.ValidationError(list(e.messages))
         return password
 
 
+class UserImportSerializer(serializers.ModelSerializer):
+    """
+    Serializer for imported users. Email uniqueness and the password policy
+    are checked by the importer for a whole chunk at once.
+    """
+
+    class Meta:
+        model = get_user_model()
+        fields = ('email', 'password', 'first_name', 'last_name', 'company_name',
+                  'country', 'require_password_change', 'preferred_language')
+        extra_kwargs = {
+            'email': {'validators': []},
+            'password': {'max_length': settings.PASSWORD_MAX_LENGTH, 'trim_whitespace': False},
+        }
+
+
 class ChangePasswordSerializer(serializers.Serializer):
     """
     Serializer for password change endpoint.
     """
 
-    old_password = serializers.CharField(required=True)
-    new_password = serializers.CharField(required=True)
+    old_password = serializers.CharField(required=True, max_length=settings.PASSWORD_MAX_LENGTH)
+    new_password = serializers.CharField(required=True, max_length=settings.PASSWORD_MAX_LENGTH)
     policy_id = serializers.CharField(required=True)
 
     class Meta:
@@ -55,57 +80,31 @@ class ChangePasswordSerializer(serializers.Serializer):
     def validate_new_password(self, password):
         errors = dict()
         try:
-            current_policy = self.context.get('user').password_policy.get(id=self.context.get('policy_id'))
-            new_validators = [
-                {
-                    'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-                    'OPTIONS': {'min_length': current_policy.min_length}
-                },
-                {
-                    'NAME': 'user.validation.MinimumLowerCaseValidator',
-                    'OPTIONS': {'min_lower': current_policy.min_lowercase}
-                },
-                {
-                    'NAME': 'user.validation.MinimumUpperCaseValidator',
-                    'OPTIONS': {'min_upper': current_policy.min_uppercase}
-                },
-                {
-                    'NAME': 'user.validation.MinimumNumberValidator',
-                    'OPTIONS': {'min_number': current_policy.min_number}
-                },
-                {
-                    'NAME': 'user.validation.MinimumSpecialValidator',
-                    'OPTIONS': {'min_special': current_policy.min_special_char}
-                },
-                {
-                    'NAME': 'user.validation.MinimumDifferentValidator',
-                    'OPTIONS': {'min_diff': current_policy.min_different_char}
-                },
-                {
-                    'NAME': 'user.validation.UserAttributeSimilarityValidator',
-                }
-                # {
-                #     'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-                # }
-            ]
-            if current_policy.max_consecutive_char:
-                new_validators.append(
-                    {
-                        'NAME': 'user.validation.MaximumRepeatingValidator',
-                        'OPTIONS': {'max_repeating': current_policy.max_consecutive_char}
-                    }
-                )
-            if current_policy.max_consecutive_char_type:
-                new_validators.append(
-                    {
-                        'NAME': 'user.validation.MaximumRepeatingTypeValidator',
-                        'OPTIONS': {'max_repeating': current_policy.max_consecutive_char_type}
-                    }
-                )
-            password_validation.validate_password(
+            validate_password(
                 password=password,
-                password_validators=password_validation.get_password_validators(new_validators)
+                user=self.context.get('user'),
+                password_validators=[compiled_policies.get(self.context.get('policy'))]
             )
         except exceptions.ValidationError as e:
             raise serializers.ValidationError(list(e.messages))
         return password
+
+
+class CredentialsSerializer(AuthTokenSerializer):
+    """
+    AuthTokenSerializer for the async login view, validation only checks the
+    fields and aauthenticate() the credentials.
+    """
+
+    def validate(self, attrs):
+        return attrs
+
+    async def aauthenticate(self):
+        """Return the authenticated user or raise a ValidationError like AuthTokenSerializer"""
+        user = await aauthenticate(request=self.context.get('request'),
+                                   username=self.validated_data['username'],
+                                   password=self.validated_data['password'])
+        if not user:
+            msg = _('Unable to log in with provided credentials.')
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [msg]}, code='authorization')
+        return user
@@ -0,0 +1,85 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import PasswordPolicy, User
+from user.importer import UserImporter
+
+PASSWORD = 'Xy7#pq!Lm'
+
+
+def records(count, prefix='user'):
+    return [{'email': '%s%d@example.com' % (prefix, i), 'password': PASSWORD + str(i)} for i in range(count)]
+
+
+class UserImporterTests(TestCase):
+
+    def test_import(self):
+        data = records(3) + [{'email': 'user0@example.com', 'password': PASSWORD}, {'email': 'short@example.com',
+                                                                                   'password': 'short'}, 'user']
+        events = list(UserImporter(chunk_size=4, workers=1).run(data))
+        self.assertEqual([event['record'] for event in events if 'errors' in event], [4, 5, 6])
+        self.assertEqual(events[-1], {'processed': 6, 'created': 3, 'rejected': 3})
+        self.assertEqual(User.objects.count(), 3)
+        user = User.objects.get(email='user1@example.com')
+        self.assertTrue(user.check_password(PASSWORD + '1'))
+        self.assertIsNotNone(user.password_expires_at)
+        self.assertTrue(PasswordPolicy.objects.get(user=user).status)
+
+    def test_resume(self):
+        data = records(5)
+        events = UserImporter(chunk_size=2, workers=1).run(data)
+        self.assertEqual(next(events), {'processed': 2, 'created': 2, 'rejected': 0})
+        events.close()
+        events = list(UserImporter(chunk_size=2, workers=1).run(data, start=2))
+        self.assertEqual(events, [{'processed': 4, 'created': 2, 'rejected': 0},
+                                  {'processed': 5, 'created': 3, 'rejected': 0}])
+        self.assertEqual(User.objects.count(), 5)
+
+
+class ImportUsersCommandTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'users.csv')
+        self.checkpoint = os.path.join(self.directory, 'checkpoint')
+        with open(self.path, 'w') as f:
+            f.write('email,password,first_name\n')
+            for record in records(5):
+                f.write('%(email)s,%(password)s,Jane\n' % record)
+
+    def call(self):
+        out = io.StringIO()
+        call_command('import_users', self.path, chunk_size=2, workers=1, checkpoint=self.checkpoint, stdout=out)
+        return out.getvalue()
+
+    def test_resume_from_checkpoint(self):
+        save_chunk = UserImporter.save_chunk
+        calls = []
+
+        def interrupted(importer, users, hashes):
+            calls.append(users)
+            if len(calls) == 2:
+                raise RuntimeError('interrupted')
+            save_chunk(importer, users, hashes)
+
+        with mock.patch.object(UserImporter, 'save_chunk', interrupted):
+            with self.assertRaisesMessage(CommandError, 'Import stopped after 2 records: interrupted'):
+                self.call()
+        with open(self.checkpoint) as f:
+            self.assertEqual(f.read(), '2')
+        self.assertEqual(User.objects.count(), 2)
+
+        output = self.call()
+        self.assertIn('Resuming after 2 records.', output)
+        self.assertIn('Imported 5 records.', output)
+        self.assertEqual(User.objects.count(), 5)
+        with open(self.checkpoint) as f:
+            self.assertEqual(f.read(), '5')
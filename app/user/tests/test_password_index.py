@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from user import password_index
+
+
+class PasswordIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'index.bin')
+
+    def build(self, passwords, **kwargs):
+        return password_index.build_index((password_index.digest(password) for password in passwords), self.path,
+                                          **kwargs)
+
+    def test_lookup(self):
+        passwords = ['password%d' % i for i in range(1000)]
+        self.assertEqual(self.build(passwords + passwords[:10], chunk_size=64), 1000)
+        index = password_index.PasswordIndex(self.path)
+        self.addCleanup(index.close)
+        for password in passwords:
+            self.assertIn(password, index)
+        self.assertIn(b'password1', index)
+        misses = [password for password in ('other%d' % i for i in range(1000)) if password in index]
+        self.assertEqual(misses, [])
+
+    def test_bloom_filter_answers_misses(self):
+        self.build(['password%d' % i for i in range(1000)])
+        index = password_index.PasswordIndex(self.path)
+        self.addCleanup(index.close)
+        with mock.patch.object(index, 'find', wraps=index.find) as find:
+            for i in range(1000):
+                'other%d' % i in index
+        # Around 1% of the misses reach the prefix table.
+        self.assertLess(find.call_count, 50)
+
+    def test_empty_index(self):
+        self.assertEqual(self.build([]), 0)
+        index = password_index.PasswordIndex(self.path)
+        self.addCleanup(index.close)
+        self.assertNotIn('password', index)
+
+    def test_read_sha1(self):
+        path = os.path.join(self.directory, 'hashes.txt')
+        with open(path, 'w') as f:
+            f.write('%s:3\nnot a digest\n' % password_index.digest('password').hex().upper())
+        self.assertEqual(list(password_index.read_sha1(path)), [password_index.digest('password')])
+
+    def test_not_an_index(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * password_index.HEADER.size)
+        with self.assertRaises(ValueError):
+            password_index.PasswordIndex(self.path)
+
+    @mock.patch.object(password_index, 'CHECK_INTERVAL', 0)
+    def test_rebuilt_index_is_mapped_again(self):
+        self.assertIsNone(password_index.open_index(self.path))
+        self.build(['first'])
+        index = password_index.open_index(self.path)
+        self.assertIn('first', index)
+        self.assertIs(password_index.open_index(self.path), index)
+        self.build(['second'])
+        rebuilt = password_index.open_index(self.path)
+        self.assertIsNot(rebuilt, index)
+        self.assertIn('second', rebuilt)
+        self.assertNotIn('first', rebuilt)
+        # Lookups running on the previous map still work.
+        self.assertIn('first', index)
+        os.remove(self.path)
+        self.assertIsNone(password_index.open_index(self.path))
@@ -0,0 +1,48 @@
+from django.test import SimpleTestCase
+
+from user.throttling import MAX_COUNT, SketchStore
+
+
+class SketchStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.store = SketchStore(period=60, width=1024, depth=4)
+
+    def test_counts_per_key(self):
+        for i in range(5):
+            self.store.add('10.0.0.1', 0)
+        self.store.add('10.0.0.2', 0)
+        self.assertEqual(self.store.count('10.0.0.1', 1), 5)
+        self.assertEqual(self.store.count('10.0.0.2', 1), 1)
+        self.assertEqual(self.store.count('10.0.0.3', 1), 0)
+
+    def test_sliding_window(self):
+        for i in range(10):
+            self.store.add('key', 30)
+        # A quarter into the next window, three quarters of the previous one still count.
+        self.assertEqual(self.store.count('key', 75), 7.5)
+        self.store.add('key', 75)
+        self.assertEqual(self.store.count('key', 75), 8.5)
+        # Two windows later nothing is left.
+        self.assertEqual(self.store.count('key', 180), 0)
+
+    def test_skipped_window_drops_the_counts(self):
+        self.store.add('key', 0)
+        self.store.add('key', 130)
+        self.assertEqual(self.store.count('key', 130), 1)
+
+    def test_collisions_only_overcount(self):
+        store = SketchStore(period=60, width=16, depth=2)
+        counts = {'user%d@example.com' % i: i % 7 for i in range(200)}
+        for key, count in counts.items():
+            for i in range(count):
+                store.add(key, 0)
+        for key, count in counts.items():
+            self.assertGreaterEqual(store.count(key, 0), count)
+
+    def test_counters_saturate(self):
+        window, current, previous = self.store.get_state(0)
+        for position in self.store.positions('key'):
+            current[position] = MAX_COUNT
+        self.store.add('key', 0)
+        self.assertEqual(self.store.count('key', 0), MAX_COUNT)
@@ -0,0 +1,194 @@
+import os
+import random
+import tempfile
+from itertools import groupby
+
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, override_settings
+
+from core.models import PasswordPolicy, User
+from user import password_index
+from user.validation import (
+    CompiledPolicy, MaximumLengthValidator, MaximumRepeatingTypeValidator, MaximumRepeatingValidator,
+    MinimumDifferentValidator, MinimumLengthValidator, MinimumLowerCaseValidator, MinimumNumberValidator,
+    MinimumSpecialValidator, MinimumUpperCaseValidator, BreachedPasswordValidator, UserAttributeSimilarityValidator,
+    SPECIAL_CHARACTERS,
+)
+
+ALPHABET = 'aabbcxyzAABXYZ0011٣²!!@#é Ω-'
+COMMON_PASSWORDS = [b'password', b'Password1!', b'qwerty123']
+
+POLICIES = [
+    {},
+    {'min_length': 12, 'min_number': 2, 'min_lowercase': 2, 'min_uppercase': 2, 'min_special_char': 2,
+     'min_different_char': 8, 'max_consecutive_char': 2, 'max_consecutive_char_type': 3},
+    {'min_length': 4, 'min_number': 1, 'max_consecutive_char': 1, 'max_consecutive_char_type': 1, 'max_length': 16},
+]
+
+
+def random_passwords(count=500, seed=0):
+    rng = random.Random(seed)
+    passwords = [''.join(rng.choice(ALPHABET) for i in range(rng.randint(0, 24))) for i in range(count)]
+    return passwords + ['jane.doe@example.com', 'example', 'Password1!', 'PASSWORD']
+
+
+def passwords_within(policy):
+    """The random passwords a policy doesn't reject for their length alone, see the max length tests"""
+    return [password for password in random_passwords() if len(password) <= policy.get('max_length', 128)]
+
+
+def reference_run(password):
+    """Longest run of one repeated character"""
+    return max((len(list(run)) for ch, run in groupby(password)), default=0)
+
+
+def reference_type_run(password):
+    """Repeats after the first character of the longest run of one character type"""
+    def find_type(ch):
+        if ch.isalpha():
+            return 'char'
+        elif ch.isdigit():
+            return 'num'
+        return 'spe'
+    return max((len(list(run)) - 1 for ch, run in groupby(password, find_type)), default=0)
+
+
+def chain(min_length=8, min_number=0, min_lowercase=0, min_uppercase=0, min_special_char=0, min_different_char=0,
+          max_consecutive_char=0, max_consecutive_char_type=0, max_length=None):
+    """The individual validators checking the same rules as a CompiledPolicy"""
+    return [
+        MaximumLengthValidator(max_length),
+        MinimumLengthValidator(min_length),
+        MinimumLowerCaseValidator(min_lowercase),
+        MinimumUpperCaseValidator(min_uppercase),
+        MinimumNumberValidator(min_number),
+        MinimumSpecialValidator(min_special_char),
+        MinimumDifferentValidator(min_different_char),
+        MaximumRepeatingValidator(max_consecutive_char),
+        MaximumRepeatingTypeValidator(max_consecutive_char_type),
+        UserAttributeSimilarityValidator(),
+        BreachedPasswordValidator(),
+    ]
+
+
+def chain_codes(validators, password, user):
+    codes = []
+    for validator in validators:
+        try:
+            validator.validate(password, user)
+        except ValidationError as error:
+            codes.append(error.code)
+    return codes
+
+
+class CounterTests(SimpleTestCase):
+    """The class counters and run lengths against straightforward per-character loops"""
+
+    def test_class_counts(self):
+        for password in random_passwords():
+            self.assertEqual(MinimumNumberValidator().count_number(password),
+                             sum(ch.isdigit() for ch in password), password)
+            self.assertEqual(MinimumLowerCaseValidator().count_lower(password),
+                             sum(ch.islower() for ch in password), password)
+            self.assertEqual(MinimumUpperCaseValidator().count_upper(password),
+                             sum(ch.isupper() for ch in password), password)
+            self.assertEqual(MinimumSpecialValidator().count_special(password),
+                             sum(ch in SPECIAL_CHARACTERS for ch in password), password)
+            self.assertEqual(MinimumDifferentValidator().count_diff(password), len(set(password)), password)
+
+    def test_run_lengths(self):
+        for password in random_passwords() + ['aaabaa', 'abbbcc', 'a1b2c3', '!!a!!!', '']:
+            self.assertEqual(MaximumRepeatingValidator().count_repeating(password),
+                             reference_run(password), password)
+            self.assertEqual(MaximumRepeatingTypeValidator().count_repeating(password),
+                             reference_type_run(password), password)
+
+    def test_runs_after_a_longer_run(self):
+        self.assertEqual(MaximumRepeatingValidator().count_repeating('aaaxbbxbb'), 3)
+        self.assertEqual(MaximumRepeatingTypeValidator().count_repeating('abcd1e1f1'), 3)
+
+    def test_non_ascii_characters(self):
+        stats = CompiledPolicy().scan('é٣Ω²')
+        self.assertEqual((stats.lower, stats.upper, stats.number), (1, 1, 2))
+
+
+class CompiledPolicyTests(SimpleTestCase):
+    """CompiledPolicy against the chain of individual validators it replaces"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        fd, cls.index_path = tempfile.mkstemp(suffix='.bin')
+        os.close(fd)
+        password_index.build_index((password_index.digest(password) for password in COMMON_PASSWORDS),
+                                   cls.index_path)
+        cls.settings_override = override_settings(PASSWORD_INDEX_PATH=cls.index_path)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        os.remove(cls.index_path)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User(email='jane.doe@example.com', first_name='Jane', last_name='Doe')
+
+    def compiled_codes(self, policy, password, mode):
+        return [error.code for error in CompiledPolicy(validation_mode=mode, **policy).get_errors(password, self.user)]
+
+    def test_full_mode(self):
+        for policy in POLICIES:
+            validators = chain(**policy)
+            for password in passwords_within(policy):
+                self.assertCountEqual(self.compiled_codes(policy, password, PasswordPolicy.FULL),
+                                      chain_codes(validators, password, self.user), (policy, password))
+
+    def test_collect_all_mode(self):
+        for policy in POLICIES:
+            validators = chain(**policy)
+            for password in passwords_within(policy):
+                expected = chain_codes(validators[:-2], password, self.user) or \
+                    chain_codes(validators, password, self.user)
+                self.assertCountEqual(self.compiled_codes(policy, password, PasswordPolicy.COLLECT_ALL), expected,
+                                      (policy, password))
+
+    def test_fail_fast_mode(self):
+        for policy in POLICIES:
+            validators = chain(**policy)
+            for password in passwords_within(policy):
+                codes = self.compiled_codes(policy, password, PasswordPolicy.FAIL_FAST)
+                expected = chain_codes(validators, password, self.user)
+                self.assertLessEqual(len(codes), 1)
+                self.assertEqual(bool(codes), bool(expected), (policy, password))
+                if codes:
+                    self.assertIn(codes[0], expected)
+
+    def test_breached_and_similar_passwords(self):
+        codes = self.compiled_codes({}, 'Password1!', PasswordPolicy.FULL)
+        self.assertEqual(codes, ['password_too_common'])
+        codes = self.compiled_codes({}, 'jane.doe@example.com', PasswordPolicy.FULL)
+        self.assertEqual(codes, ['password_too_similar'])
+
+    def test_too_long_password_is_only_rejected_for_its_length(self):
+        policy = CompiledPolicy(min_number=3, max_consecutive_char=1, max_length=16)
+        for mode in (PasswordPolicy.FULL, PasswordPolicy.COLLECT_ALL, PasswordPolicy.FAIL_FAST):
+            policy.validation_mode = mode
+            self.assertEqual([error.code for error in policy.get_errors('a' * 17)], ['password_too_long'])
+        self.assertNotIn('password_too_long', [error.code for error in policy.get_errors('a' * 16)])
+        with self.assertRaises(ValidationError) as context:
+            policy.validate('a' * 17)
+        self.assertEqual(context.exception.error_list[0].params, {'max_length': 16})
+
+    @override_settings(PASSWORD_MAX_LENGTH=32)
+    def test_max_length_defaults_to_the_setting(self):
+        self.assertEqual([error.code for error in CompiledPolicy().get_errors('Aa1!' * 9)], ['password_too_long'])
+
+    def test_from_policy(self):
+        policy = PasswordPolicy(min_length=10, min_number=2, max_consecutive_char=2, max_length=20,
+                                validation_mode=PasswordPolicy.FAIL_FAST)
+        compiled = CompiledPolicy.from_policy(policy)
+        self.assertEqual(compiled.validation_mode, PasswordPolicy.FAIL_FAST)
+        self.assertEqual(compiled.max_length_validator.max_length, 20)
+        self.assertEqual(self.compiled_codes({'min_length': 10, 'min_number': 2}, 'short', PasswordPolicy.FAIL_FAST),
+                         [error.code for error in compiled.get_errors('short')])
@@ -0,0 +1,106 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import IntegrityError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from core.models import PasswordHistory, PasswordPolicy, PasswordPolicyManager, User
+from user import hashing, throttling
+from user.serializers import ChangePasswordSerializer
+
+OLD_PASSWORD = 'Old#Pass123'
+NEW_PASSWORD = 'New#Pass456'
+
+
+class ChangePasswordTests(APITestCase):
+
+    def setUp(self):
+        throttling._stores.clear()
+        self.user = User.objects.create_user(email='jane@example.com', password=OLD_PASSWORD)
+        self.policy = PasswordPolicy.default_for(self.user)
+        self.policy.save()
+        self.client.force_authenticate(self.user)
+
+    def change_password(self, policy=None, old_password=OLD_PASSWORD, new_password=NEW_PASSWORD):
+        return self.client.put('/api/change-password/', {
+            'old_password': old_password,
+            'new_password': new_password,
+            'policy_id': (policy or self.policy).pk,
+        }, format='json')
+
+    def assertPasswordUnchanged(self):
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password(OLD_PASSWORD))
+        self.assertFalse(PasswordHistory.objects.exists())
+
+    def test_change_password(self):
+        Token.objects.create(user=self.user)
+        response = self.change_password()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password(NEW_PASSWORD))
+        self.assertEqual(self.user.password_expires_at, self.user.password_changed_at + timedelta(days=90))
+        self.assertEqual(PasswordHistory.objects.filter(user=self.user).count(), 1)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+
+    def test_change_password_queries(self):
+        # Policy, history, then savepoint, lock, update, history insert and trim, token delete, release.
+        with self.assertNumQueries(9):
+            response = self.change_password()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_activates_the_policy(self):
+        policy = PasswordPolicy.objects.create(name='Strict', user=self.user, min_length=10)
+        response = self.change_password(policy)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(PasswordPolicy.objects.filter(user=self.user, status=True)), [policy])
+
+    def test_wrong_old_password(self):
+        response = self.change_password(old_password='Wrong#Pass123')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('old_password', response.data)
+        self.assertPasswordUnchanged()
+
+    def test_too_long_old_password_is_not_hashed(self):
+        with mock.patch.object(hashing, 'check_user_password') as check_user_password:
+            response = self.change_password(old_password='a' * 5000)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        check_user_password.assert_not_called()
+
+    def test_policy_of_another_user(self):
+        other = User.objects.create_user(email='john@example.com', password=OLD_PASSWORD)
+        policy = PasswordPolicy.default_for(other)
+        policy.save()
+        response = self.change_password(policy)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertPasswordUnchanged()
+
+    def test_invalid_new_password(self):
+        response = self.change_password(new_password='short')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('new_password', response.data)
+        self.assertPasswordUnchanged()
+
+    def test_policy_changed_during_validation(self):
+        validate_new_password = ChangePasswordSerializer.validate_new_password
+
+        def concurrent_update(serializer, password):
+            PasswordPolicy.objects.filter(pk=self.policy.pk).update(
+                min_length=20, last_updated=timezone.now() + timedelta(seconds=1))
+            return validate_new_password(serializer, password)
+
+        with mock.patch.object(ChangePasswordSerializer, 'validate_new_password', concurrent_update):
+            response = self.change_password()
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn('policy_id', response.data)
+        self.assertPasswordUnchanged()
+
+    def test_concurrent_policy_activation(self):
+        policy = PasswordPolicy.objects.create(name='Strict', user=self.user)
+        with mock.patch.object(PasswordPolicyManager, 'activate', side_effect=IntegrityError):
+            response = self.change_password(policy)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertPasswordUnchanged()
@@ -0,0 +1,175 @@
+"""
+Sliding window throttling of the login and change-password endpoints.
+Attempts are counted per client IP and per email address. They are rejected
+in the throttle checks DRF runs before the view, so a rejected attempt never
+reaches the password hasher.
+The counts live in a fixed size count-min sketch per window in each process,
+whatever the number of keys, or in a shared Django cache when
+THROTTLE_STORE['CACHE_ALIAS'] is set so all the processes see the same
+counts.
+"""
+import hashlib
+import threading
+from array import array
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+MAX_COUNT = 0xffff
+
+
+class SketchStore:
+    """
+    Approximate sliding window counts of any number of keys in fixed memory.
+    Each window is a count-min sketch of `depth` rows of `width` 16 bit
+    counters, so a count can only be overestimated, by colliding keys. The
+    count of a key is the count of the current window plus the part of the
+    previous window still inside the sliding window.
+    Updates take no lock, concurrent requests may lose an increment.
+    """
+
+    def __init__(self, period, width=65536, depth=4):
+        self.period = period
+        self.width = width
+        self.depth = depth
+        # (window number, current counters, previous counters), replaced as a whole
+        self.state = (0, self.new_counters(), self.new_counters())
+
+    def new_counters(self):
+        return array('H', bytes(2 * self.width * self.depth))
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * self.depth).digest()
+        return [row * self.width + int.from_bytes(digest[4 * row:4 * row + 4], 'big') % self.width
+                for row in range(self.depth)]
+
+    def get_state(self, now):
+        window = int(now // self.period)
+        state = self.state
+        if state[0] != window:
+            previous = state[1] if state[0] == window - 1 else self.new_counters()
+            state = self.state = (window, self.new_counters(), previous)
+        return state
+
+    def count(self, key, now):
+        window, current, previous = self.get_state(now)
+        positions = self.positions(key)
+        elapsed = now / self.period - window
+        return min(current[p] for p in positions) + min(previous[p] for p in positions) * (1 - elapsed)
+
+    def add(self, key, now):
+        window, current, previous = self.get_state(now)
+        positions = self.positions(key)
+        # Conservative update: only raise the counters below the new count.
+        value = min(min(current[p] for p in positions) + 1, MAX_COUNT)
+        for p in positions:
+            if current[p] < value:
+                current[p] = value
+
+
+class CacheStore:
+    """Sliding window counts kept in a shared Django cache"""
+
+    def __init__(self, period, cache_alias):
+        self.period = period
+        self.cache = caches[cache_alias]
+
+    def cache_key(self, key, window):
+        return 'throttle:%s:%d' % (hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest(), window)
+
+    def count(self, key, now):
+        window = int(now // self.period)
+        current_key, previous_key = self.cache_key(key, window), self.cache_key(key, window - 1)
+        counts = self.cache.get_many([current_key, previous_key])
+        elapsed = now / self.period - window
+        return counts.get(current_key, 0) + counts.get(previous_key, 0) * (1 - elapsed)
+
+    def add(self, key, now):
+        current_key = self.cache_key(key, int(now // self.period))
+        self.cache.add(current_key, 0, 2 * self.period)
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            # expired in between
+            self.cache.set(current_key, 1, 2 * self.period)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(scope, period):
+    """Return the shared store of a throttle scope and period"""
+    store = _stores.get((scope, period))
+    if store is None:
+        with _stores_lock:
+            store = _stores.get((scope, period))
+            if store is None:
+                options = getattr(settings, 'THROTTLE_STORE', {})
+                if options.get('CACHE_ALIAS'):
+                    store = CacheStore(period, options['CACHE_ALIAS'])
+                else:
+                    store = SketchStore(period, options.get('WIDTH', 65536), options.get('DEPTH', 4))
+                store = _stores[(scope, period)] = store
+    return store
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Throttle limiting the requests of a view per identity, with the rate of
+    the `<view.throttle_scope>_<kind>` entry of DEFAULT_THROTTLE_RATES.
+    Views without a rate for their scope are not throttled. Rejected
+    requests are not counted.
+    """
+    kind = None
+
+    def __init__(self):
+        # The rate depends on the view, it is read in allow_request.
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = '%s_%s' % (getattr(view, 'throttle_scope', None), self.kind)
+        self.rate = self.THROTTLE_RATES.get(self.scope)
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        ident = self.get_cache_key(request, view)
+        if not ident:
+            return True
+        store = get_store(self.scope, self.duration)
+        self.now = self.timer()
+        if store.count(ident, self.now) >= self.num_requests:
+            return False
+        store.add(ident, self.now)
+        return True
+
+    def wait(self):
+        return self.duration - self.now % self.duration
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    """
+    Throttle per client IP address, REMOTE_ADDR unless NUM_PROXIES trusts
+    entries of X-Forwarded-For.
+    """
+    kind = 'ip'
+
+    def get_cache_key(self, request, view):
+        return self.get_ident(request)
+
+
+class EmailRateThrottle(SlidingWindowThrottle):
+    """
+    Throttle per email address, the authenticated user's or the username
+    sent to log in.
+    """
+    kind = 'email'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.email.lower()
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if isinstance(username, str):
+            return username.strip().lower()
+        return None
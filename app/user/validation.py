@@ -1,11 +1,219 @@
+import math
 import re
-from difflib import SequenceMatcher
-from pathlib import Path
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
 
-from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from django.contrib.auth import password_validation
 from django.utils.translation import gettext as _, ngettext
 
+from core import metrics
+from core.models import PasswordHistory, PasswordPolicy
+from user import hashing, password_index
+
+SPECIAL_CHARACTERS = "[@_!#$%^&*()<>?/\\|}{~:]"
+
+# Character class flags, a character can have several of them.
+DIGIT, LOWER, UPPER, SPECIAL, ALPHA = 1, 2, 4, 8, 16
+CHAR_TYPE, NUMBER_TYPE, SPECIAL_TYPE = 'char', 'num', 'spe'
+
+# Size of the alphabet each character class adds to the entropy estimate,
+# characters outside of all the classes count as OTHER_POOL_SIZE.
+POOL_SIZES = ((DIGIT, 'number', 10), (LOWER, 'lower', 26), (UPPER, 'upper', 26),
+              (SPECIAL, 'special', len(set(SPECIAL_CHARACTERS))))
+OTHER_POOL_SIZE = 32
+
+PasswordStats = namedtuple('PasswordStats', [
+    'length', 'number', 'lower', 'upper', 'special', 'different', 'max_repeating', 'max_repeating_type',
+])
+
+
+def classify(ch):
+    """Return the class flags of a character."""
+    flags = 0
+    if ch.isdigit():
+        flags |= DIGIT
+    if ch.islower():
+        flags |= LOWER
+    if ch.isupper():
+        flags |= UPPER
+    if ch in SPECIAL_CHARACTERS:
+        flags |= SPECIAL
+    if ch.isalpha():
+        flags |= ALPHA
+    return flags
+
+
+def char_type(flags):
+    """Return the repeating type of a character from its class flags."""
+    if flags & ALPHA:
+        return CHAR_TYPE
+    if flags & DIGIT:
+        return NUMBER_TYPE
+    return SPECIAL_TYPE
+
+
+class CharacterClasses(dict):
+    """
+    str.translate() table mapping characters to chr(class flags). ASCII is
+    precomputed and other characters are classified on first use; they are
+    only kept while the table is small, so odd input can't grow it forever.
+    """
+    MAX_SIZE = 65536
+
+    def __missing__(self, code):
+        flags = chr(classify(chr(code)))
+        if len(self) < self.MAX_SIZE:
+            self[code] = flags
+        return flags
+
+
+CHARACTER_CLASSES = CharacterClasses((code, chr(classify(chr(code)))) for code in range(128))
+
+# str.translate() tables keeping the characters of one repeating type and blanking the others.
+REPEATING_TYPES = [
+    {flags: 'x' if char_type(flags) == repeating_type else ' ' for flags in range(32)}
+    for repeating_type in (CHAR_TYPE, NUMBER_TYPE, SPECIAL_TYPE)
+]
+
+# Runs of at least two equal characters, so single characters cost no match object.
+CLASS_FLAGS = [chr(flags) for flags in range(32)]
+
+RUN = re.compile(r'(.)\1+', re.DOTALL)
+
+
+def classify_password(password):
+    """Return the password with each character replaced by chr(its class flags)."""
+    return password.translate(CHARACTER_CLASSES)
+
+
+def count_classes(classes):
+    """Return the number of characters of each class flags found in a classified password."""
+    return {ord(flags): classes.count(flags) for flags in CLASS_FLAGS if flags in classes}
+
+
+def count_class(classes, flag, counts=None):
+    """Count the characters of a classified password which have a class flag."""
+    counts = count_classes(classes) if counts is None else counts
+    return sum(count for flags, count in counts.items() if flags & flag)
+
+
+def longest_run(value):
+    """Return the length of the longest run of one repeated character."""
+    if not value:
+        return 0
+    return max((match.end() - match.start() for match in RUN.finditer(value)), default=1)
+
+
+def longest_type_run(classes):
+    """Return the number of repeats after the first character in the longest run of one type."""
+    longest = max(max(map(len, classes.translate(table).split()), default=0) for table in REPEATING_TYPES)
+    return max(longest - 1, 0)
+
+
+def validate_password(password, user=None, password_validators=None):
+    """
+    Same as password_validation.validate_password, also timing every
+    validator and counting the error codes of rejected passwords. A
+    CompiledPolicy times its own rules, its total goes to a metric of its own.
+    """
+    if password_validators is None:
+        password_validators = password_validation.get_default_password_validators()
+    errors = []
+    for validator in password_validators:
+        start = time.perf_counter()
+        try:
+            validator.validate(password, user)
+        except ValidationError as error:
+            errors.append(error)
+        finally:
+            if isinstance(validator, CompiledPolicy):
+                metrics.policy_validation_seconds.observe(time.perf_counter() - start)
+            else:
+                metrics.validator_seconds.observe(time.perf_counter() - start, type(validator).__name__)
+    if errors:
+        error = ValidationError(errors)
+        for item in error.error_list:
+            metrics.validation_errors.inc(item.code)
+        raise error
+
+
+class MinimumLengthValidator(password_validation.MinimumLengthValidator):
+    """Validator for checking minimum length"""
+
+    def get_error(self):
+        return ValidationError(
+            ngettext(
+                "This password is too short. It must contain at least %(min_length)d character.",
+                "This password is too short. It must contain at least %(min_length)d characters.",
+                self.min_length
+            ),
+            code='password_too_short',
+            params={'min_length': self.min_length},
+        )
+
+    def validate(self, password, user=None):
+        if len(password) < self.min_length:
+            raise self.get_error()
+
+
+class MaximumLengthValidator:
+    """Validator for checking maximum length"""
+
+    def __init__(self, max_length=None):
+        self.max_length = max_length or settings.PASSWORD_MAX_LENGTH
+
+    def get_error(self):
+        return ValidationError(
+            ngettext(
+                "This password is too long. It must contain at most %(max_length)d character.",
+                "This password is too long. It must contain at most %(max_length)d characters.",
+                self.max_length
+            ),
+            code='password_too_long',
+            params={'max_length': self.max_length},
+        )
+
+    def validate(self, password, user=None):
+        if len(password) > self.max_length:
+            raise self.get_error()
+
+    def get_help_text(self):
+        return ngettext(
+            "Your password must contain at most %(max_length)d character.",
+            "Your password must contain at most %(max_length)d characters.",
+            self.max_length
+        ) % {'max_length': self.max_length}
+
+
+class SimilarityProfile:
+    """
+    Character multiset of a lower cased string. Comparing two profiles gives
+    the same ratio as difflib's SequenceMatcher.quick_ratio(), in time linear
+    in the number of distinct characters.
+    """
+    __slots__ = ('length', 'counts')
+
+    def __init__(self, value):
+        value = value.lower()
+        self.length = len(value)
+        self.counts = Counter(value)
+
+    def real_quick_ratio(self, other):
+        """Return an upper bound of ratio() computed from the lengths only"""
+        total = self.length + other.length
+        return 2.0 * min(self.length, other.length) / total if total else 1.0
+
+    def ratio(self, other):
+        total = self.length + other.length
+        if not total:
+            return 1.0
+        small, large = sorted((self.counts, other.counts), key=len)
+        matches = sum(min(count, large.get(ch, 0)) for ch, count in small.items())
+        return 2.0 * matches / total
+
 
 class UserAttributeSimilarityValidator:
     """
@@ -16,37 +224,124 @@ class UserAttributeSimilarityValidator:
     not only the full attribute value, but also its components, so that, for
     example, a password is validated against either part of an email address,
     as well as the full address.
+    The attribute profiles are computed once and kept on the user object.
     """
-    DEFAULT_USER_ATTRIBUTES = ['email']
+    DEFAULT_USER_ATTRIBUTES = ['first_name', 'last_name', 'company_name', 'email']
 
     def __init__(self, user_attributes=DEFAULT_USER_ATTRIBUTES, max_similarity=0.7):
         self.user_attributes = user_attributes
         self.max_similarity = max_similarity
 
+    def get_profiles(self, user):
+        """Return the (attribute name, profile) pairs of the user's attributes"""
+        values = tuple(getattr(user, attribute_name, None) for attribute_name in self.user_attributes)
+        key = (tuple(self.user_attributes), values)
+        cached = getattr(user, '_similarity_profiles', None)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        profiles = []
+        for attribute_name, value in zip(self.user_attributes, values):
+            if not value or not isinstance(value, str):
+                continue
+            value_parts = re.split(r'\W+', value) + [value]
+            if '@' in value:
+                # local part and domain of an email address
+                value_parts.extend(value.rsplit('@', 1))
+            profiles.extend(
+                (attribute_name, SimilarityProfile(value_part)) for value_part in dict.fromkeys(value_parts) if value_part
+            )
+        user._similarity_profiles = (key, profiles)
+        return profiles
+
     def validate(self, password, user=None):
         if not user:
             return
-        for attribute_name in self.user_attributes:
-            value = getattr(user, attribute_name, None)
-            if not value or not isinstance(value, str):
+        password_profile = SimilarityProfile(password)
+        for attribute_name, profile in self.get_profiles(user):
+            if password_profile.real_quick_ratio(profile) < self.max_similarity:
                 continue
-            value_parts = re.split(r'\W+', value) + [value]
-            for value_part in value_parts:
-                if SequenceMatcher(a=password.lower(), b=value_part.lower()).quick_ratio() >= self.max_similarity:
-                    try:
-                        verbose_name = str(user._meta.get_field(attribute_name).verbose_name)
-                    except FieldDoesNotExist:
-                        verbose_name = attribute_name
-                    raise ValidationError(
-                        _("The password is too similar to the %(verbose_name)s."),
-                        code='password_too_similar',
-                        params={'verbose_name': verbose_name},
-                    )
+            if password_profile.ratio(profile) >= self.max_similarity:
+                try:
+                    verbose_name = str(user._meta.get_field(attribute_name).verbose_name)
+                except FieldDoesNotExist:
+                    verbose_name = attribute_name
+                raise ValidationError(
+                    _("The password is too similar to the %(verbose_name)s."),
+                    code='password_too_similar',
+                    params={'verbose_name': verbose_name},
+                )
 
     def get_help_text(self):
         return _("Your password can't be too similar to your other personal information.")
 
 
+class BreachedPasswordValidator:
+    """
+    Validate whether the password is a known common or breached password.
+    The passwords are looked up in the memory-mapped index written by the
+    build_password_index command, both as given and lower cased. The check
+    is skipped while the index has not been built.
+    """
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path or settings.PASSWORD_INDEX_PATH
+
+    def get_error(self):
+        return ValidationError(
+            _("This password is too common."),
+            code='password_too_common',
+        )
+
+    def validate(self, password, user=None):
+        index = password_index.open_index(self.index_path)
+        if index is None:
+            return
+        if password in index or (password.lower() != password and password.lower() in index):
+            raise self.get_error()
+
+    def get_help_text(self):
+        return _("Your password can't be a commonly used password.")
+
+
+class PasswordHistoryValidator:
+    """
+    Validate whether the password differs from the user's current password
+    and the previous ones kept in the password history. The hashes are
+    checked in parallel, so the history depth doesn't add up in latency.
+    """
+
+    def __init__(self, history=0):
+        self.history = history
+
+    def get_error(self):
+        return ValidationError(
+            ngettext(
+                "This password must differ from your last %(history)d password.",
+                "This password must differ from your last %(history)d passwords.",
+                self.history
+            ),
+            code='password_reused',
+            params={'history': self.history},
+        )
+
+    def validate(self, password, user=None):
+        if not self.history or user is None or user.pk is None:
+            return
+        encoded_passwords = [user.password] + list(
+            PasswordHistory.objects.filter(user=user).order_by('-created', '-id')
+            .values_list('password', flat=True)[:self.history - 1]
+        )
+        if hashing.check_password_any(password, encoded_passwords):
+            raise self.get_error()
+
+    def get_help_text(self):
+        return ngettext(
+            "Your password must differ from your last %(history)d password.",
+            "Your password must differ from your last %(history)d passwords.",
+            self.history
+        ) % {'history': self.history}
+
+
 class MinimumNumberValidator:
     """Validator for chacking munimum numbers """
 
@@ -54,22 +349,22 @@ class MinimumNumberValidator:
         self.min_number = min_number
 
     def count_number(self, password):
-        count = 0
-        for ch in password:
-            count += 1 if ch.isdigit() else 0
-        return count
+        return count_class(classify_password(password), DIGIT)
+
+    def get_error(self):
+        return ValidationError(
+            ngettext(
+                "This password must contain at least %(min_number)d number.",
+                "This password must contain at least %(min_number)d numbers.",
+                self.min_number
+            ),
+            code='password_number_short',
+            params={'min_number': self.min_number},
+        )
 
     def validate(self, password, user=None):
         if self.count_number(password) < self.min_number:
-            raise ValidationError(
-                ngettext(
-                    "This password must contain at least %(min_number)d number.",
-                    "This password must contain at least %(min_number)d numbers.",
-                    self.min_number
-                ),
-                code='password_number_short',
-                params={'min_number': self.min_number},
-            )
+            raise self.get_error()
 
     def get_help_text(self):
         return ngettext(
@@ -86,22 +381,22 @@ class MinimumLowerCaseValidator:
         self.min_lower = min_lower
 
     def count_lower(self, password):
-        count = 0
-        for ch in password:
-            count += 1 if ch.islower() else 0
-        return count
+        return count_class(classify_password(password), LOWER)
+
+    def get_error(self):
+        return ValidationError(
+            ngettext(
+                "This password must contain at least %(min_lower)d lower case character.",
+                "This password must contain at least %(min_lower)d lower case characters.",
+                self.min_lower
+            ),
+            code='password_lower_case_short',
+            params={'min_lower': self.min_lower},
+        )
 
     def validate(self, password, user=None):
         if self.count_lower(password) < self.min_lower:
-            raise ValidationError(
-                ngettext(
-                    "This password must contain at least %(min_lower)d lower case character.",
-                    "This password must contain at least %(min_lower)d lower case characters.",
-                    self.min_lower
-                ),
-                code='password_lower_case_short',
-                params={'min_lower': self.min_lower},
-            )
+            raise self.get_error()
 
     def get_help_text(self):
         return ngettext(
@@ -118,22 +413,22 @@ class MinimumUpperCaseValidator:
         self.min_upper = min_upper
 
     def count_upper(self, password):
-        count = 0
-        for ch in password:
-            count += 1 if ch.isupper() else 0
-        return count
+        return count_class(classify_password(password), UPPER)
+
+    def get_error(self):
+        return ValidationError(
+            ngettext(
+                "This password must contain at least %(min_upper)d upper case character.",
+                "This password must contain at least %(min_upper)d upper case characters.",
+                self.min_upper
+            ),
+            code='password_upper_case_short',
+            params={'min_upper': self.min_upper},
+        )
 
     def validate(self, password, user=None):
         if self.count_upper(password) < self.min_upper:
-            raise ValidationError(
-                ngettext(
-                    "This password must contain at least %(min_upper)d upper case character.",
-                    "This password must contain at least %(min_upper)d upper case characters.",
-                    self.min_upper
-                ),
-                code='password_upper_case_short',
-                params={'min_upper': self.min_upper},
-            )
+            raise self.get_error()
 
     def get_help_text(self):
         return ngettext(
@@ -150,23 +445,22 @@ class MinimumSpecialValidator:
         self.min_special = min_special
 
     def count_special(self, password):
-        count = 0
-        special = "[@_!#$%^&*()<>?/\|}{~:]"
-        for ch in password:
-            count += 1 if ch in special else 0
-        return count
+        return count_class(classify_password(password), SPECIAL)
+
+    def get_error(self):
+        return ValidationError(
+            ngettext(
+                "This password must contain at least %(min_special)d special case character.",
+                "This password must contain at least %(min_special)d special case characters.",
+                self.min_special
+            ),
+            code='password_special_case_short',
+            params={'min_special': self.min_special},
+        )
 
     def validate(self, password, user=None):
         if self.count_special(password) < self.min_special:
-            raise ValidationError(
-                ngettext(
-                    "This password must contain at least %(min_special)d special case character.",
-                    "This password must contain at least %(min_special)d special case characters.",
-                    self.min_special
-                ),
-                code='password_special_case_short',
-                params={'min_special': self.min_special},
-            )
+            raise self.get_error()
 
     def get_help_text(self):
         return ngettext(
@@ -183,25 +477,22 @@ class MinimumDifferentValidator:
         self.min_diff = min_diff
 
     def count_diff(self, password):
-        count = 0
-        diff = ""
-        for ch in password:
-            if ch not in diff:
-                count += 1
-                diff += ch
-        return count
+        return len(set(password))
+
+    def get_error(self):
+        return ValidationError(
+            ngettext(
+                "This password must contain at least %(min_diff)d different character.",
+                "This password must contain at least %(min_diff)d different characters.",
+                self.min_diff
+            ),
+            code='password_different_short',
+            params={'min_diff': self.min_diff},
+        )
 
     def validate(self, password, user=None):
         if self.count_diff(password) < self.min_diff:
-            raise ValidationError(
-                ngettext(
-                    "This password must contain at least %(min_diff)d different character.",
-                    "This password must contain at least %(min_diff)d different characters.",
-                    self.min_diff
-                ),
-                code='password_different_short',
-                params={'min_diff': self.min_diff},
-            )
+            raise self.get_error()
 
     def get_help_text(self):
         return ngettext(
@@ -218,30 +509,22 @@ class MaximumRepeatingValidator:
         self.max_repeating = max_repeating
 
     def count_repeating(self, password):
-        n = len(password)
-        count = 0
-        res = password[0]
-        cur_count = 1
-        for i in range(n):
-            if (i < n - 1 and password[i] == password[i + 1]):
-                cur_count += 1
-            elif cur_count > count:
-                count = cur_count
-                res = password[i]
-                cur_count = 1
-        return count
+        return longest_run(password)
+
+    def get_error(self):
+        return ValidationError(
+            ngettext(
+                "This password must not contain more than %(max_repeating)d repeating character.",
+                "This password must not contain more than %(max_repeating)d repeating characters.",
+                self.max_repeating
+            ),
+            code='password_maximum_repeating',
+            params={'max_repeating': self.max_repeating},
+        )
 
     def validate(self, password, user=None):
         if self.max_repeating and self.count_repeating(password) > self.max_repeating:
-            raise ValidationError(
-                ngettext(
-                    "This password must not contain more than %(max_repeating)d repeating character.",
-                    "This password must not contain more than %(max_repeating)d repeating characters.",
-                    self.max_repeating
-                ),
-                code='password_maximum_repeating',
-                params={'max_repeating': self.max_repeating},
-            )
+            raise self.get_error()
 
     def get_help_text(self):
         return ngettext(
@@ -257,38 +540,23 @@ class MaximumRepeatingTypeValidator:
     def __init__(self, max_repeating=0):
         self.max_repeating = max_repeating
 
-    def find_type(self, ch):
-        if ch.isalpha():
-            return 'char'
-        elif ch.isdigit():
-            return 'num'
-        return 'spe'
-
     def count_repeating(self, password):
-        n = len(password)
-        count = 0
-        res = password[0]
-        cur_count = 0
-        for i in range(n):
-            if (i < n - 1 and self.find_type(password[i]) == self.find_type(password[i+1])):
-                cur_count += 1
-            elif cur_count > count:
-                count = cur_count
-                res = password[i]
-                cur_count = 0
-        return count
+        return longest_type_run(classify_password(password))
+
+    def get_error(self):
+        return ValidationError(
+            ngettext(
+                "This password must not contain more than %(max_repeating)d repeating type character.",
+                "This password must not contain more than %(max_repeating)d repeating type characters.",
+                self.max_repeating
+            ),
+            code='password_maximum_repeating_type',
+            params={'max_repeating': self.max_repeating},
+        )
 
     def validate(self, password, user=None):
         if self.max_repeating and self.count_repeating(password) > self.max_repeating:
-            raise ValidationError(
-                ngettext(
-                    "This password must not contain more than %(max_repeating)d repeating type character.",
-                    "This password must not contain more than %(max_repeating)d repeating type characters.",
-                    self.max_repeating
-                ),
-                code='password_maximum_repeating',
-                params={'max_repeating': self.max_repeating},
-            )
+            raise self.get_error()
 
     def get_help_text(self):
         return ngettext(
@@ -296,3 +564,209 @@ class MaximumRepeatingTypeValidator:
             "Your password must not contain more than %(max_repeating)d repeating type characters.",
             self.max_repeating
         ) % {'max_repeating': self.max_repeating}
+
+
+class CompiledPolicy:
+    """
+    Validate a password against every rule of a password policy at once.
+    The password is scanned a single time to collect the character class
+    counts and run lengths, then each rule is checked against those counts,
+    with the error codes of the individual validators above. A too long
+    password is rejected before anything else runs.
+    The similarity, breached and history checks are the expensive ones and
+    run last. The validation mode decides what is reported:
+    - full: every violation.
+    - collect_all: every violation of the cheap rules, the expensive checks
+      only run once all of those passed.
+    - fail_fast: the first violation only.
+    """
+
+    def __init__(self, min_length=8, min_number=0, min_lowercase=0, min_uppercase=0, min_special_char=0,
+                 min_different_char=0, max_consecutive_char=0, max_consecutive_char_type=0, pwd_history=0,
+                 max_length=None, validation_mode=PasswordPolicy.FULL):
+        self.validation_mode = validation_mode
+        self.max_length_validator = MaximumLengthValidator(max_length)
+        self.similarity_validator = UserAttributeSimilarityValidator()
+        self.breached_validator = BreachedPasswordValidator()
+        self.history_validator = PasswordHistoryValidator(pwd_history)
+        self.expensive_validators = [self.similarity_validator, self.breached_validator, self.history_validator]
+        # (validator, stats field, limit, limit is a maximum)
+        self.rules = [
+            (MinimumLengthValidator(min_length), 'length', min_length, False),
+            (MinimumLowerCaseValidator(min_lowercase), 'lower', min_lowercase, False),
+            (MinimumUpperCaseValidator(min_uppercase), 'upper', min_uppercase, False),
+            (MinimumNumberValidator(min_number), 'number', min_number, False),
+            (MinimumSpecialValidator(min_special_char), 'special', min_special_char, False),
+            (MinimumDifferentValidator(min_different_char), 'different', min_different_char, False),
+        ]
+        if max_consecutive_char:
+            self.rules.append(
+                (MaximumRepeatingValidator(max_consecutive_char), 'max_repeating', max_consecutive_char, True)
+            )
+        if max_consecutive_char_type:
+            self.rules.append(
+                (MaximumRepeatingTypeValidator(max_consecutive_char_type), 'max_repeating_type',
+                 max_consecutive_char_type, True)
+            )
+
+    @classmethod
+    def from_policy(cls, policy):
+        """Build the compiled validator of a PasswordPolicy"""
+        return cls(
+            min_length=policy.min_length,
+            min_number=policy.min_number,
+            min_lowercase=policy.min_lowercase,
+            min_uppercase=policy.min_uppercase,
+            min_special_char=policy.min_special_char,
+            min_different_char=policy.min_different_char,
+            max_consecutive_char=policy.max_consecutive_char,
+            max_consecutive_char_type=policy.max_consecutive_char_type,
+            pwd_history=policy.pwd_history,
+            max_length=policy.max_length,
+            validation_mode=policy.validation_mode,
+        )
+
+    def scan(self, password):
+        """Collect all the counts checked by the policy from one classification of the password"""
+        classes = classify_password(password)
+        counts = count_classes(classes)
+        return PasswordStats(
+            length=len(password),
+            number=count_class(classes, DIGIT, counts),
+            lower=count_class(classes, LOWER, counts),
+            upper=count_class(classes, UPPER, counts),
+            special=count_class(classes, SPECIAL, counts),
+            different=len(set(password)),
+            max_repeating=longest_run(password),
+            max_repeating_type=longest_type_run(classes),
+        )
+
+    def get_errors(self, password, user=None):
+        """
+        Return the list of ValidationError of the violated rules, cheapest
+        rules first.
+        """
+        if len(password) > self.max_length_validator.max_length:
+            return [self.max_length_validator.get_error()]
+        fail_fast = self.validation_mode == PasswordPolicy.FAIL_FAST
+        length_validator, field, min_length, maximum = self.rules[0]
+        if fail_fast and len(password) < min_length:
+            return [length_validator.get_error()]
+        start = time.perf_counter()
+        stats = self.scan(password)
+        errors = []
+        for validator, field, limit, maximum in self.rules:
+            value = getattr(stats, field)
+            if (value > limit) if maximum else (value < limit):
+                errors.append(validator.get_error())
+                if fail_fast:
+                    break
+        metrics.validator_seconds.observe(time.perf_counter() - start, 'CompiledPolicy.rules')
+        if errors and self.validation_mode != PasswordPolicy.FULL:
+            return errors
+        for validator in self.expensive_validators:
+            start = time.perf_counter()
+            try:
+                validator.validate(password, user)
+            except ValidationError as error:
+                errors.append(error)
+                if fail_fast:
+                    return errors
+            finally:
+                metrics.validator_seconds.observe(time.perf_counter() - start, type(validator).__name__)
+        return errors
+
+    def check(self, password, user=None):
+        """
+        Return (error code, passed) for every rule of the policy, in the
+        order they are validated, and the password stats. The history check
+        is left out as it needs to hash the password.
+        """
+        stats = self.scan(password)
+        results = [(self.max_length_validator.get_error().code, stats.length <= self.max_length_validator.max_length)]
+        for validator, field, limit, maximum in self.rules:
+            value = getattr(stats, field)
+            results.append((validator.get_error().code, (value <= limit) if maximum else (value >= limit)))
+        for code, validator in (('password_too_similar', self.similarity_validator),
+                                ('password_too_common', self.breached_validator)):
+            try:
+                validator.validate(password, user)
+            except ValidationError:
+                results.append((code, False))
+            else:
+                results.append((code, True))
+        return results, stats
+
+    @staticmethod
+    def entropy(stats):
+        """
+        Estimate the entropy of a password in bits from its stats, as its
+        length times log2 of the size of the alphabet of its classes.
+        """
+        if not stats.length:
+            return 0.0
+        pool = sum(size for flag, field, size in POOL_SIZES if getattr(stats, field))
+        if stats.length > sum(getattr(stats, field) for flag, field, size in POOL_SIZES):
+            pool += OTHER_POOL_SIZE
+        return stats.length * math.log2(max(pool, 2))
+
+    def evaluate_many(self, passwords, user=None):
+        """
+        Yield the list of violated error codes of each password, or None for
+        items that are not strings.
+        """
+        for password in passwords:
+            if not isinstance(password, str):
+                yield None
+                continue
+            yield [error.code for error in self.get_errors(password, user)]
+
+    def validate(self, password, user=None):
+        errors = self.get_errors(password, user)
+        if errors:
+            raise ValidationError(errors)
+
+    def get_help_text(self):
+        return ' '.join(
+            [self.max_length_validator.get_help_text()] +
+            [rule[0].get_help_text() for rule in self.rules] +
+            [validator.get_help_text() for validator in self.expensive_validators]
+        )
+
+
+class CompiledPolicyCache:
+    """
+    Least recently used cache of CompiledPolicy objects, keyed by policy id
+    and last update time so a policy is only compiled again once it changed.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, policy):
+        key = (policy.pk, policy.last_updated)
+        with self.lock:
+            compiled = self.entries.get(key)
+            if compiled is not None:
+                self.entries.move_to_end(key)
+                return compiled
+        compiled = CompiledPolicy.from_policy(policy)
+        with self.lock:
+            self.entries[key] = compiled
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return compiled
+
+    def invalidate(self, policy_id):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == policy_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+compiled_policies = CompiledPolicyCache(getattr(settings, 'PASSWORD_POLICY_CACHE_SIZE', 128))
@@ -1,4 +1,9 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth import login, authenticate
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
 from rest_framework import views, viewsets, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -6,17 +11,26 @@ from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated
 
-from user import serializers, permissions
-from core.models import User, PasswordPolicy
+from user import hashing, serializers, permissions, throttling
+from user.importer import UserImporter
+from core.models import User, PasswordPolicy, PasswordHistory
+from core.database import ReplicaReadMixin, database_sync_to_async
+from core.pagination import IdCursorPagination
+from core.views import AsyncAPIViewMixin
+from password_policy.parsers import CSVParser, NDJSONParser
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """model view set for user"""
     serializer_class = serializers.UserSerializer
     permission_classes = [permissions.UserPermission, ]
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
         qs = User.objects.all()
+        if self.action == 'list':
+            # Only load the serialized columns.
+            qs = qs.only(*[field for field in self.serializer_class.Meta.fields if field != 'password'])
         if self.request.user.is_superuser:
             return qs
         return qs.filter(email=self.request.user.email)
@@ -26,6 +40,22 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer_class()(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(methods=('post',), detail=False, url_path='import', parser_classes=(CSVParser, NDJSONParser),
+            permission_classes=(permissions.SuperUserPermission,))
+    def import_users(self, request):
+        """
+        Bulk import users from a CSV (with a header row) or NDJSON body and
+        stream back one NDJSON line per rejected record and per committed
+        chunk. ?start=N skips the first N records to resume an import.
+        """
+        try:
+            start = max(int(request.query_params.get('start', 0)), 0)
+        except ValueError:
+            return Response({'start': 'Expected a number of records.'}, status=status.HTTP_400_BAD_REQUEST)
+        events = UserImporter().run(request.data, start=start)
+        return StreamingHttpResponse((json.dumps(event) + '\n' for event in events),
+                                     content_type='application/x-ndjson')
+
     def get_serializer_context(self):
         """Extra context provided to the serializer class."""
         return {
@@ -36,11 +66,16 @@ class UserViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """Create user default policy"""
         user = serializer.save()
-        PasswordPolicy.objects.create(name='Default', min_length=8, status=True, user=user)
+        policy = PasswordPolicy.default_for(user)
+        policy.save()
+        user.update_password_expiry(policy)
+        user.save(update_fields=User.PASSWORD_EXPIRY_FIELDS)
 
 
 class LoginView(ObtainAuthToken):
     """Login view"""
+    throttle_classes = (throttling.IPRateThrottle, throttling.EmailRateThrottle)
+    throttle_scope = 'login'
 
     def post(self, request, format=None):
         serializer = self.serializer_class(data=request.data,
@@ -62,6 +97,8 @@ class ChangePasswordView(generics.UpdateAPIView):
     serializer_class = serializers.ChangePasswordSerializer
     model = User
     permission_classes = (IsAuthenticated, )
+    throttle_classes = (throttling.IPRateThrottle, throttling.EmailRateThrottle)
+    throttle_scope = 'change_password'
 
     def get_object(self, queryset=None):
         return self.request.user
@@ -69,41 +106,110 @@ class ChangePasswordView(generics.UpdateAPIView):
     def update(self, request, *args, **kwargs):
         self.object = self.get_object()
 
-        # Check old password
-        if not self.object.check_password(request.data.get("old_password")):
+        # Check old password, too long ones are rejected before hashing.
+        old_password = request.data.get("old_password")
+        if not isinstance(old_password, str) or len(old_password) > settings.PASSWORD_MAX_LENGTH or \
+                not hashing.check_user_password(self.object, old_password):
             return Response({"old_password": ["Wrong password."]},
                             status=status.HTTP_400_BAD_REQUEST)
+        return self.change_password(request)
 
-        serializer = self.get_serializer(data=request.data)
+    def change_password(self, request):
+        """Validate and save the new password of a user whose old password was checked"""
         # Chek policy id belongs to user
         try:
-
-            PasswordPolicy.objects.get(user=self.request.user, id=request.data.get('policy_id'))
-        except PasswordPolicy.DoesNotExist:
+            self.policy = PasswordPolicy.objects.get(user=self.request.user, id=request.data.get('policy_id'))
+        except (PasswordPolicy.DoesNotExist, ValueError):
             return Response({'ploicy_id': 'Does not belong to you.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if serializer.is_valid():
-            # set_password also hashes the password that the user will get
-            self.object.set_password(serializer.data.get("new_password"))
-            self.object.save()
-
-            # Set active policy.
-            PasswordPolicy.objects.filter(user=self.request.user, status=True).update(status=False)
-            PasswordPolicy.objects.filter(user=self.request.user, id=request.data.get('policy_id')).update(status=True)
-            Token.objects.filter(user=self.request.user).delete()
-            response = {
-                'status': 'success',
-                'code': status.HTTP_200_OK,
-                'message': 'Password updated successfully, please login again.',
-                'data': []
-            }
-            return Response(response)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # The history check and the hashing are slow, they run before the
+        # transaction so that it only holds the database write lock for the writes.
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        previous_password = self.object.password
+        self.object.set_password(serializer.validated_data['new_password'])
+        self.object.require_password_change = False
+        self.object.update_password_expiry(self.policy)
+
+        conflict = Response({'policy_id': 'The password policy changed, please try again.'},
+                            status=status.HTTP_409_CONFLICT)
+        try:
+            with transaction.atomic():
+                # Lock the user row, so concurrent changes of the user's password
+                # and policies run one after the other, checking in the same
+                # query that the policy is still the one validated against.
+                if not User.objects.select_for_update().filter(
+                        pk=self.object.pk, password_policy=self.policy,
+                        password_policy__last_updated=self.policy.last_updated).exists():
+                    return conflict
+                self.object.save(update_fields=['password', 'require_password_change'] + User.PASSWORD_EXPIRY_FIELDS)
+                # The current password is checked apart from the history.
+                PasswordHistory.objects.record(self.object, previous_password, keep=self.policy.pwd_history - 1)
+
+                if not self.policy.status:
+                    PasswordPolicy.objects.activate(self.request.user, self.policy.pk)
+                # Saving the user dropped its cached tokens, no need for the
+                # per token delete signals.
+                tokens = Token.objects.filter(user=self.request.user)
+                tokens._raw_delete(tokens.db)
+        except IntegrityError:
+            # Another policy was activated at the same time.
+            return conflict
+        response = {
+            'status': 'success',
+            'code': status.HTTP_200_OK,
+            'message': 'Password updated successfully, please login again.',
+            'data': []
+        }
+        return Response(response)
 
     def get_serializer_context(self):
         """Extra context provided to the serializer class."""
         return {
             'view': self,
             'user': self.request.user,
-            'policy_id': self.request.data.get('policy_id')
+            'policy': getattr(self, 'policy', None)
         }
+
+
+class AsyncUserViewSet(AsyncAPIViewMixin, UserViewSet):
+    """User view set running `me` as an async view"""
+
+    async def me(self, request):
+        # The user was loaded by the authentication, nothing left to wait for.
+        return super().me(request)
+
+
+class AsyncLoginView(AsyncAPIViewMixin, LoginView):
+    """Login view checking the password without holding a thread"""
+    serializer_class = serializers.CredentialsSerializer
+
+    async def post(self, request, format=None):
+        serializer = self.serializer_class(data=request.data,
+                                           context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        user = await serializer.aauthenticate()
+        token, created = await database_sync_to_async(Token.objects.get_or_create)(user=user)
+        return Response({
+            'token': token.key,
+            'user_id': user.pk,
+            'email': user.email
+        })
+
+
+class AsyncChangePasswordView(AsyncAPIViewMixin, ChangePasswordView):
+    """
+    Change password view checking the old password without holding a
+    thread, the new one is validated and saved in a database thread.
+    """
+
+    async def update(self, request, *args, **kwargs):
+        self.object = self.get_object()
+
+        old_password = request.data.get("old_password")
+        if not isinstance(old_password, str) or len(old_password) > settings.PASSWORD_MAX_LENGTH or \
+                not await hashing.acheck_user_password(self.object, old_password):
+            return Response({"old_password": ["Wrong password."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return await database_sync_to_async(self.change_password)(request)